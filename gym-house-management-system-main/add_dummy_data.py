@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import MembershipPlan, Trainer, WorkoutPlan, Member, User
+from app.services.hashing import get_password_hasher
 from datetime import date, timedelta
 
 app = create_app()
@@ -52,11 +53,14 @@ with app.app_context():
         db.session.commit()
         print("Added Members.")
 
-        for member in members:
-            if not User.query.filter_by(email=member.email).first():
-                user = User(username=member.name.lower().replace(" ", ""), email=member.email, role='subscription')
-                user.set_password('password')
-                db.session.add(user)
+        new_members = [m for m in members if not User.query.filter_by(email=m.email).first()]
+        # Hash all passwords in one go on the worker pool
+        hashes = get_password_hasher().hash_many(['password'] * len(new_members))
+        for member, password_hash in zip(new_members, hashes):
+            # Linked to the member, which is how their own records are found
+            user = User(username=member.name.lower().replace(" ", ""), email=member.email, role='subscription',
+                        password_hash=password_hash, member=member)
+            db.session.add(user)
         db.session.commit()
         print("Added Users for Members.")
     else:
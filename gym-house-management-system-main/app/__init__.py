@@ -3,24 +3,34 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
-from config import Config
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import config_by_name
+from app.database import RoutingSession
 import os
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
 
-def create_app(config_class=Config):
+def create_app(config_class=None):
+    if config_class is None:
+        config_class = config_by_name[os.environ.get('FLASK_CONFIG') or 'default']
     app = Flask(__name__)
     app.config.from_object(config_class)
+    proxies = app.config['TRUSTED_PROXY_COUNT']
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
 
     try:
         os.makedirs(app.instance_path)
     except OSError:
         pass
 
-    db.init_app(app)
+    from app import database
+    database.init_app(app, db)
+    from app import profiling
+    profiling.init_app(app, db)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     bcrypt.init_app(app)
@@ -31,10 +41,13 @@ def create_app(config_class=Config):
     from app import routes
     app.register_blueprint(routes.bp)
 
-    from app.models import User
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    from app import commands
+    commands.init_app(app)
+
+    from app import auth
+    auth.init_app(app, login_manager)
+    from app import http_cache
+    http_cache.init_app(app)
 
     # Error handlers
     @app.errorhandler(403)
@@ -0,0 +1,163 @@
+from functools import wraps
+from flask import abort, current_app, flash, request
+from flask_login import UserMixin, current_user, logout_user
+from app import db
+from app.cache import TTLCache, on_tables_written
+from app.models import User
+
+# Flask-Login loads the user on every authenticated request. Instead of a
+# User query each time, the loader keeps a small per-process cache of
+# read-only snapshots of the columns requests use.
+#
+# The session stores "<user id>:<credential stamp>" (User.get_id()), and the
+# stamp changes whenever the user's password hash or role does. A session
+# whose stamp no longer matches the database is logged out, so a password
+# reset or role change ends the user's other sessions. Writes to the user
+# table in this process drop the cache at once. Another process may still
+# hold the old snapshot for up to USER_CACHE_TTL, so views restricted to
+# some roles, and every request that is not a GET or HEAD, re-read the
+# stamp from the database first (one primary-key lookup): a demoted admin
+# or a reset password is refused there at once, and only read-only pages
+# open to every role can be served from the old snapshot.
+
+_cache = TTLCache(ttl=60, maxsize=1024)
+
+ADMIN, SUBSCRIPTION = 'admin', 'subscription'
+ROLES = (ADMIN, SUBSCRIPTION)
+
+# Flashed when a role is turned away from a page meant for these roles
+_DENIED_MESSAGES = {
+    frozenset({ADMIN}): 'Access denied. Admins only.',
+    frozenset({ADMIN, SUBSCRIPTION}): 'Access denied. Admins and Subscription users only.',
+}
+
+
+class SessionUser(UserMixin):
+    """What current_user is for a logged-in request: the user's id, username,
+    email, role and member_id. Query User for anything else."""
+
+    def __init__(self, id, username, email, role, member_id, credential_stamp):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.member_id = member_id
+        self.credential_stamp = credential_stamp
+
+    def get_id(self):
+        return f'{self.id}:{self.credential_stamp}'
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+def _parse_session_id(session_id):
+    user_id, _, stamp = session_id.partition(':')
+    try:
+        return int(user_id), stamp
+    except ValueError:
+        return None, None
+
+
+def _load(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email, User.role, User.member_id, User.password_hash)
+        .where(User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return None
+    return SessionUser(row.id, row.username, row.email, row.role, row.member_id,
+                       User.stamp_for(row.password_hash, row.role))
+
+
+def load_user(session_id):
+    """Flask-Login user loader; returns None (logged out) for unknown users
+    and for sessions from before the last password or role change."""
+    user_id, stamp = _parse_session_id(session_id)
+    if not stamp:
+        # Malformed, or a session from before stamps were stored
+        return None
+    ttl = current_app.config['USER_CACHE_TTL']
+    user = _cache.get((user_id, stamp)) if ttl > 0 else None
+    if user is None:
+        user = _load(user_id)
+        if user is None or user.credential_stamp != stamp:
+            return None
+        if ttl > 0:
+            _cache.ttl = ttl
+            _cache.set((user_id, stamp), user)
+    return user
+
+
+def credentials_current(user):
+    """Whether `user`'s session stamp still matches the database (role and
+    password unchanged), bypassing the cache."""
+    row = db.session.execute(
+        db.select(User.role, User.password_hash).where(User.id == user.id)
+    ).one_or_none()
+    return row is not None and User.stamp_for(row.password_hash, row.role) == user.credential_stamp
+
+
+# --- Permissions ---
+# Views declare the roles allowed to use them with @roles_required. When the
+# app is set up, the declarations are compiled into one table of role ->
+# allowed endpoints (app.extensions['permissions']), and each request is
+# checked with a set lookup.
+
+def roles_required(*roles, flash_denied=True):
+    """Allow only logged-in users with one of `roles`; others get a 403
+    (with a flashed message unless `flash_denied` is False, e.g. for JSON).
+    Replaces @login_required."""
+    allowed = frozenset(roles)
+    unknown = allowed - set(ROLES)
+    if unknown:
+        raise ValueError(f'unknown roles: {sorted(unknown)}')
+    # The cached user may be up to USER_CACHE_TTL old in other processes
+    privileged = allowed != frozenset(ROLES)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return current_app.login_manager.unauthorized()
+            if privileged or request.method not in ('GET', 'HEAD'):
+                if not credentials_current(current_user):
+                    _cache.pop((current_user.id, current_user.credential_stamp))
+                    logout_user()
+                    return current_app.login_manager.unauthorized()
+            if request.endpoint not in current_app.extensions['permissions'].get(current_user.role, ()):
+                if flash_denied:
+                    flash(_DENIED_MESSAGES.get(allowed, 'Access denied.'), 'danger')
+                abort(403)
+            return view(*args, **kwargs)
+        wrapped.allowed_roles = allowed
+        return wrapped
+    return decorator
+
+
+def build_permissions(app):
+    """{role: frozenset of endpoints} from the views' @roles_required."""
+    endpoints = {role: set() for role in ROLES}
+    for endpoint, view in app.view_functions.items():
+        for role in getattr(view, 'allowed_roles', ()):
+            endpoints[role].add(endpoint)
+    return {role: frozenset(names) for role, names in endpoints.items()}
+
+
+def can_access_member(member_id):
+    """Admins see every member; subscription users only their own, by the
+    member id held in their session identity (no query)."""
+    return current_user.role == ADMIN or current_user.member_id == member_id
+
+
+@on_tables_written('user')
+def _invalidate_users(tables=None):
+    _cache.clear()
+
+
+def init_app(app, login_manager):
+    """Register the user loader and build the permission table; call after
+    the blueprints are registered."""
+    _cache.maxsize = app.config['USER_CACHE_SIZE']
+    login_manager.user_loader(load_user)
+    app.extensions['permissions'] = build_permissions(app)
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class TTLCache:
+    """Small thread-safe in-process cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if self.maxsize and key not in self._data and len(self._data) >= self.maxsize:
+                # Evict the entry closest to expiry
+                oldest = min(self._data, key=lambda k: self._data[k][0])
+                del self._data[oldest]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LRUCache:
+    """Small thread-safe in-process cache holding the `maxsize` most recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# --- Write tracking ---
+# Callbacks registered here run after a commit that inserted, updated or
+# deleted rows in one of the tables they listen to. Caches use this to drop
+# stale entries without every route having to remember to do it. Each table
+# also gets a version counter that is bumped on every such commit.
+
+_write_listeners = []
+_table_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+
+
+def table_version(*table_names):
+    with _versions_lock:
+        return tuple(_table_versions[name] for name in table_names)
+
+
+def on_tables_written(*table_names):
+    def decorator(callback):
+        _write_listeners.append((frozenset(table_names), callback))
+        return callback
+    return decorator
+
+
+def mark_written(session, *table_names):
+    # For writes that bypass the unit of work, e.g. Query.update()
+    session.info.setdefault('written_tables', set()).update(table_names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_written_tables(session, flush_context):
+    tables = session.info.setdefault('written_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_write_listeners(session):
+    tables = session.info.pop('written_tables', None)
+    if not tables:
+        return
+    with _versions_lock:
+        for name in tables:
+            _table_versions[name] += 1
+    for listened, callback in _write_listeners:
+        written = tables & listened
+        if written:
+            callback(written)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_written_tables(session):
+    session.info.pop('written_tables', None)
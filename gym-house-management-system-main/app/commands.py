@@ -0,0 +1,200 @@
+import json
+import time
+from datetime import date, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from app.database import replica_reads, sync_sqlite_replicas
+from app.services.export import EXPORTS, FORMATS
+from app.services.importer import import_members, import_payments
+from app.services import rollups, search
+from app.services.visits import close_stale_visits
+from app.services.memberships import refresh_statuses
+from app.services.revenue import compute_revenue_report
+from app.services.notifications import deliver_pending, get_notifier, queue_renewal_reminders
+
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First date to include.')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last date to include.')
+@click.option('--member-id', type=int, help='Only rows for this member.')
+@click.option('--chunk-size', type=click.IntRange(min=1), help='Rows per round trip (default: EXPORT_CHUNK_SIZE).')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='Output file (default: stdout).')
+@with_appcontext
+def export_command(kind, fmt, start, end, member_id, chunk_size, output):
+    """Stream members, payments or attendance to CSV/NDJSON."""
+    iter_rows = FORMATS[fmt][0]
+    chunk_size = chunk_size or current_app.config['EXPORT_CHUNK_SIZE']
+    for chunk in iter_rows(kind, start=start.date() if start else None, end=end.date() if end else None,
+                           member_id=member_id, chunk_size=chunk_size):
+        output.write(chunk)
+    output.flush()
+
+
+def _print_import_report(label, report, max_errors):
+    click.echo(f'{label}: {report.rows} rows read, {report.inserted} inserted, '
+               f'{report.duplicates} duplicates skipped, {len(report.errors)} errors '
+               f'in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)')
+    for line, message in report.errors[:max_errors]:
+        click.echo(f'  line {line}: {message}', err=True)
+    if len(report.errors) > max_errors:
+        click.echo(f'  ... {len(report.errors) - max_errors} more errors', err=True)
+
+
+@click.command('import-members')
+@click.argument('members_csv', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--payments', 'payments_csv', type=click.File('r', encoding='utf-8-sig'),
+              help='Payment history CSV to load after the members.')
+@click.option('--chunk-size', type=int, default=1000, show_default=True)
+@click.option('--max-errors', type=int, default=50, show_default=True, help='Errors to print per file.')
+@with_appcontext
+def import_members_command(members_csv, payments_csv, chunk_size, max_errors):
+    """Bulk-load members, their user accounts and payment history from CSV."""
+    _print_import_report('Members', import_members(members_csv, chunk_size), max_errors)
+    if payments_csv:
+        _print_import_report('Payments', import_payments(payments_csv, chunk_size), max_errors)
+
+
+@click.command('rebuild-rollups')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild.')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild.')
+@with_appcontext
+def rebuild_rollups_command(start, end):
+    """Recompute the daily attendance and revenue rollups from the raw tables."""
+    attendance, revenue = rollups.rebuild(start=start.date() if start else None, end=end.date() if end else None)
+    click.echo(f'Rebuilt {attendance} attendance and {revenue} revenue rollup rows.')
+
+
+@click.command('close-stale-visits')
+@click.option('--max-hours', type=int, help='Close visits open longer than this (default: OPEN_VISIT_MAX_HOURS).')
+@click.option('--assume-minutes', type=int,
+              help='Visit length recorded for them (default: OCCUPANCY_DEFAULT_VISIT_MINUTES).')
+@with_appcontext
+def close_stale_visits_command(max_hours, assume_minutes):
+    """Check out visits nobody checked out, e.g. from a cron job."""
+    config = current_app.config
+    closed = close_stale_visits(timedelta(hours=max_hours or config['OPEN_VISIT_MAX_HOURS']),
+                                timedelta(minutes=assume_minutes or config['OCCUPANCY_DEFAULT_VISIT_MINUTES']))
+    click.echo(f'Closed {closed} stale visits.')
+
+
+@click.command('refresh-memberships')
+@click.option('--chunk-size', type=int, default=1000, show_default=True)
+@with_appcontext
+def refresh_memberships_command(chunk_size):
+    """Update membership statuses and queue renewal reminders; run daily."""
+    changed, added = refresh_statuses(chunk_size=chunk_size)
+    click.echo(f'{changed} membership statuses changed, {added} renewal notices recorded.')
+    click.echo(f'{queue_renewal_reminders()} renewal reminders queued.')
+
+
+@click.command('deliver-notifications')
+@click.option('--batch-size', type=int, help='Messages claimed per batch (default: NOTIFICATION_BATCH_SIZE).')
+@click.option('--watch', is_flag=True, help='Keep running and poll for new messages.')
+@click.option('--interval', type=float, default=10, show_default=True, help='Seconds between polls with --watch.')
+@with_appcontext
+def deliver_notifications_command(batch_size, watch, interval):
+    """Send queued reminders and receipts."""
+    total_sent = total_failed = 0
+    try:
+        while True:
+            sent, failed = deliver_pending(batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if not watch:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_notifier().shutdown()
+    click.echo(f'{total_sent} notifications sent, {total_failed} failed.')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Regenerate the full-text search index from the indexed tables."""
+    try:
+        counts = search.rebuild()
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    click.echo('Indexed ' + ', '.join(f'{count} {kind} rows' for kind, count in counts.items()) + '.')
+
+
+@click.command('revenue-report')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day (default: 12 months back).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day (default: today).')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON.')
+@with_appcontext
+def revenue_report_command(start, end, as_json):
+    """Print monthly revenue, MRR, churn, per-plan revenue and lifetime value."""
+    end = end.date() if end else date.today()
+    start = start.date() if start else (end.replace(day=1) - timedelta(days=334)).replace(day=1)
+    if start > end:
+        raise click.ClickException('--start must not be after --end.')
+    if (end - start).days >= current_app.config['REVENUE_REPORT_MAX_DAYS']:
+        raise click.ClickException(f"Reports cover at most {current_app.config['REVENUE_REPORT_MAX_DAYS']} days.")
+    with replica_reads():
+        report = compute_revenue_report(start, end)
+    if as_json:
+        click.echo(json.dumps(report, default=str, indent=2))
+        return
+
+    def percent(value):
+        return '-' if value is None else f'{value * 100:+.1f}%'
+
+    click.echo(f"{'Month':<9}{'Revenue':>14}{'Growth':>9}{'MRR':>14}{'Active':>8}{'Churned':>9}{'Churn':>8}")
+    for month in report['months']:
+        click.echo(f"{month['month']:<9}{month['revenue']:>14,}{percent(month['revenue_growth']):>9}"
+                   f"{month['mrr']:>14,}{month['active_members']:>8}{month['churned_members']:>9}"
+                   f"{month['churn_rate'] * 100:>7.1f}%")
+    click.echo()
+    for plan in report['plans']:
+        click.echo(f"{plan['name']:<30}{plan['payments']:>8} payments{plan['revenue']:>14,}")
+    totals = report['totals']
+    click.echo()
+    click.echo(f"Revenue {totals['revenue']:,} ({percent(totals['growth'])} on the previous period), "
+               f"ARPU {totals['arpu_per_month'] or '-'} per month, "
+               f"churn {(totals['monthly_churn_rate'] or 0) * 100:.1f}% per month, "
+               f"lifetime value {totals['lifetime_value'] or '-'}")
+
+
+@click.command('sync-replicas')
+@click.option('--watch', is_flag=True, help='Keep copying every --interval seconds.')
+@click.option('--interval', type=float, default=5, show_default=True, help='Seconds between copies with --watch.')
+@with_appcontext
+def sync_replicas_command(watch, interval):
+    """Copy the SQLite primary over the SQLite replicas (development stand-in for replication)."""
+    if not current_app.config['SQLALCHEMY_REPLICA_URIS']:
+        raise click.ClickException('No replicas configured (DATABASE_REPLICA_URLS).')
+    try:
+        while True:
+            try:
+                count = sync_sqlite_replicas(db)
+            except RuntimeError as exc:
+                raise click.ClickException(str(exc))
+            click.echo(f'{count} replicas synced.')
+            if not watch:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def init_app(app):
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_members_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(close_stale_visits_command)
+    app.cli.add_command(refresh_memberships_command)
+    app.cli.add_command(deliver_notifications_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(revenue_report_command)
+    app.cli.add_command(sync_replicas_command)
@@ -0,0 +1,210 @@
+import os
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from app.cache import table_version
+
+# Read replicas. Each URL in SQLALCHEMY_REPLICA_URIS becomes a bind named
+# replica_<n>, and RoutingSession sends reads to one of them while
+# `replica_reads()` is active: read-only views opt in with @use_replica, and
+# reporting code outside a request can use the context manager directly.
+# Everything else stays on the primary, and so does a replica-routed session
+# as soon as it writes (flush, DML or SELECT ... FOR UPDATE). After a request
+# commits a write, the browser session reads from the primary for
+# REPLICA_STICKY_SECONDS, so the page it is redirected to shows the change
+# even if the replicas lag behind. Other users can see data up to the
+# replication lag old.
+#
+# What a replica returns may predate writes this process has already
+# counted in its table versions, so caches and ETags must not file it under
+# them. cache_version() gives replica reads their own version instead: how
+# far the replicas have been synced (for SQLite replicas, the time of the
+# marker file sync-replicas touches after each copy, and this process's sync
+# count) and a time bucket of REPLICA_CACHE_TTL seconds, which bounds how
+# long a cached replica result outlives replication it cannot observe.
+
+REPLICA_BIND_PREFIX = 'replica_'
+SYNC_MARKER_SUFFIX = '.synced'
+_syncs = 0
+
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+
+def replica_bind_keys(config):
+    return [f'{REPLICA_BIND_PREFIX}{n}' for n in range(len(config['SQLALCHEMY_REPLICA_URIS']))]
+
+
+def _is_write(clause):
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from `info['replica']`, when set,
+    until the session writes."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # mark_written() records writes that bypass both checks
+        if self._flushing or _is_write(clause) or self.info.get('written_tables'):
+            self.info['wrote'] = True
+        replica = self.info.get('replica')
+        if bind is None and replica is not None and not self.info.get('wrote'):
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _stay_on_primary(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_to_primary(session):
+    if session.info.get('wrote') and has_request_context() and replica_bind_keys(current_app.config):
+        http_session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+
+
+@contextmanager
+def replica_reads():
+    """Send the session's reads to a random replica inside the block (a
+    no-op if none are configured)."""
+    replicas = replica_bind_keys(current_app.config)
+    session = current_app.extensions['sqlalchemy'].session()
+    if not replicas or session.info.get('replica'):
+        yield
+        return
+    session.info['replica'] = random.choice(replicas)
+    g.read_replica = True
+    try:
+        yield
+    finally:
+        session.info.pop('replica', None)
+
+
+def read_from_replica():
+    """True once the current request (or app context) has been routed to a
+    replica; its results must not be cached under table versions."""
+    return g.get('read_replica', False)
+
+
+def _replica_position(engine):
+    # Not the database file's own times: SQLite touches those (and its WAL)
+    # on reads too
+    try:
+        return os.stat(engine.url.database + SYNC_MARKER_SUFFIX).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def replica_version():
+    """Version for results read from a replica; see the notes above."""
+    engines = current_app.extensions['sqlalchemy'].engines
+    positions = tuple(_replica_position(engines[key]) for key in replica_bind_keys(current_app.config))
+    return 'replica', _syncs, positions, int(time.time() // current_app.config['REPLICA_CACHE_TTL'])
+
+
+def cache_version(*table_names):
+    """What to file a result read for `table_names` under: the primary's
+    table_version(), or replica_version() if this request read from a
+    replica."""
+    return replica_version() if read_from_replica() else table_version(*table_names)
+
+
+def routes_to_replica():
+    """Whether a @use_replica view would read from a replica now."""
+    return (bool(current_app.config['SQLALCHEMY_REPLICA_URIS'])
+            and http_session.get('primary_until', 0) <= time.time())
+
+
+def use_replica(view):
+    """Serve a read-only view from a replica, unless this browser session
+    wrote recently (read-your-writes)."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not routes_to_replica():
+            return view(*args, **kwargs)
+        with replica_reads():
+            return view(*args, **kwargs)
+    wrapped.reads_replica = True
+    return wrapped
+
+
+def sync_sqlite_replicas(db):
+    """Copy a SQLite primary over each SQLite replica with the backup API;
+    a stand-in for replication when developing. Returns the replica count."""
+    global _syncs
+    engines = [db.engine] + [db.engines[key] for key in replica_bind_keys(current_app.config)]
+    if any(engine.dialect.name != 'sqlite' for engine in engines):
+        raise RuntimeError('sync-replicas only copies SQLite databases; use the database\'s own replication')
+    source = db.engine.raw_connection()
+    try:
+        for engine in engines[1:]:
+            target = sqlite3.connect(engine.url.database)
+            try:
+                source.driver_connection.backup(target)
+            finally:
+                target.close()
+            marker = engine.url.database + SYNC_MARKER_SUFFIX
+            open(marker, 'a').close()
+            os.utime(marker)
+    finally:
+        source.close()
+    _syncs += 1
+    return len(engines) - 1
+
+
+def engine_options(config, uri=None):
+    """SQLAlchemy engine options for `uri` (default: the configured
+    database URI).
+
+    Server databases get a sized connection pool with pre-ping and recycle.
+    SQLite gets a driver-level lock timeout matching SQLITE_BUSY_TIMEOUT_MS;
+    its pragmas are applied per connection by `apply_sqlite_pragmas`.
+    """
+    if is_sqlite(uri or config['SQLALCHEMY_DATABASE_URI']):
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def apply_sqlite_pragmas(engine, config):
+    # Run on every new DBAPI connection: WAL lets readers carry on while a
+    # check-in batch is being written, and busy_timeout makes a second writer
+    # wait for the lock instead of failing with "database is locked".
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def init_app(app, db):
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for key, uri in zip(replica_bind_keys(app.config), app.config['SQLALCHEMY_REPLICA_URIS']):
+        binds[key] = {'url': uri, **engine_options(app.config, uri)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                apply_sqlite_pragmas(engine, app.config)
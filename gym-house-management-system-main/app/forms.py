@@ -1,14 +1,53 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, DateField, SelectField, FloatField, IntegerField, DateTimeField, TextAreaField, PasswordField, BooleanField
-from wtforms.validators import DataRequired, Email, Optional, NumberRange, EqualTo, ValidationError
+from wtforms import StringField, SubmitField, DateField, SelectField, DecimalField, IntegerField, DateTimeField, TextAreaField, PasswordField, BooleanField
+from wtforms.validators import DataRequired, Email, Optional, NumberRange, EqualTo, Length, ValidationError, StopValidation
+from wtforms.widgets import HiddenInput
+from app import db
+from app.lookups import lookup_choices
 from app.models import MembershipPlan, Trainer, WorkoutPlan, Member, User # Import User
+from app.money import from_cents, to_cents
 from datetime import date, datetime
+from decimal import Decimal
+
+# Largest price or payment the forms accept
+MAX_AMOUNT = Decimal('1000000')
+
+class MemberPickerField(IntegerField):
+    # Filled in by the type-ahead picker (static/js/member_picker.js) instead of
+    # rendering every member as a select option. Validation only loads the
+    # submitted member, which is then available as `field.member`.
+    widget = HiddenInput()
+
+    def __init__(self, *args, **kwargs):
+        super(MemberPickerField, self).__init__(*args, **kwargs)
+        self.member = None
+
+    def pre_validate(self, form):
+        if not self.data:
+            return
+        self.member = db.session.get(Member, self.data)
+        if self.member is None:
+            raise StopValidation('Selected member does not exist.')
+
+class MoneyField(DecimalField):
+    # Rounds the submitted amount to whole cents the way to_cents() stores
+    # it, so what is validated, saved and shown on receipts is the same.
+    # Infinity and NaN are not amounts.
+
+    def process_formdata(self, valuelist):
+        super(MoneyField, self).process_formdata(valuelist)
+        if self.data is not None:
+            try:
+                self.data = from_cents(to_cents(self.data))
+            except ValueError:
+                self.data = None
+                raise ValueError(self.gettext('Not a valid amount.'))
 
 class InquiryForm(FlaskForm):
-    name = StringField('Full Name', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    phone = StringField('Phone Number', validators=[Optional()])
-    message = TextAreaField('Message', validators=[Optional()])
+    name = StringField('Full Name', validators=[DataRequired(), Length(max=100)])
+    email = StringField('Email', validators=[DataRequired(), Email(), Length(max=120)])
+    phone = StringField('Phone Number', validators=[Optional(), Length(max=20)])
+    message = TextAreaField('Message', validators=[Optional(), Length(max=5000)])
     submit = SubmitField('Submit Inquiry')
 
 class MemberForm(FlaskForm):
@@ -28,13 +67,13 @@ class MemberForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(MemberForm, self).__init__(*args, **kwargs)
-        self.membership_plan.choices = [(plan.id, plan.name) for plan in MembershipPlan.query.order_by('name').all()]
+        self.membership_plan.choices = lookup_choices(MembershipPlan)
         self.membership_plan.choices.insert(0, (0, 'Select a plan')) # Add a default "Select" option
 
-        self.trainer.choices = [(trainer.id, trainer.name) for trainer in Trainer.query.order_by('name').all()]
+        self.trainer.choices = lookup_choices(Trainer)
         self.trainer.choices.insert(0, (0, 'Select a trainer'))
 
-        self.workout_plan.choices = [(wp.id, wp.name) for wp in WorkoutPlan.query.order_by('name').all()]
+        self.workout_plan.choices = lookup_choices(WorkoutPlan)
         self.workout_plan.choices.insert(0, (0, 'Select a workout plan'))
 
 class MemberAndUserForm(MemberForm):
@@ -57,34 +96,26 @@ class MemberAndUserForm(MemberForm):
 class MembershipPlanForm(FlaskForm):
     name = StringField('Plan Name', validators=[DataRequired()])
     duration_days = IntegerField('Duration (Days)', validators=[DataRequired(), NumberRange(min=1)])
-    price = FloatField('Price', validators=[DataRequired(), NumberRange(min=0)])
+    price = MoneyField('Price', places=2, validators=[DataRequired(), NumberRange(min=0, max=MAX_AMOUNT)])
     submit = SubmitField('Submit')
 
 class PaymentForm(FlaskForm):
-    member = SelectField('Member', coerce=int, validators=[DataRequired()])
-    amount = FloatField('Amount', validators=[DataRequired(), NumberRange(min=0)])
+    member = MemberPickerField('Member', validators=[DataRequired()])
+    amount = MoneyField('Amount', places=2, validators=[DataRequired(), NumberRange(min=0, max=MAX_AMOUNT)])
     payment_date = DateField('Payment Date', format='%Y-%m-%d', default=date.today, validators=[DataRequired()])
     membership_plan = SelectField('Membership Plan (Optional)', coerce=int, validators=[Optional()])
     submit = SubmitField('Record Payment')
 
     def __init__(self, *args, **kwargs):
         super(PaymentForm, self).__init__(*args, **kwargs)
-        self.member.choices = [(m.id, m.name) for m in Member.query.order_by('name').all()]
-        self.member.choices.insert(0, (0, 'Select a member'))
-
-        self.membership_plan.choices = [(plan.id, plan.name) for plan in MembershipPlan.query.order_by('name').all()]
+        self.membership_plan.choices = lookup_choices(MembershipPlan)
         self.membership_plan.choices.insert(0, (0, 'No specific plan'))
 
 class AttendanceForm(FlaskForm):
-    member = SelectField('Member', coerce=int, validators=[DataRequired()])
+    member = MemberPickerField('Member', validators=[DataRequired()])
     check_in_time = DateTimeField('Check-in Time', format='%Y-%m-%d %H:%M', default=datetime.now, validators=[DataRequired()])
     submit = SubmitField('Check In')
 
-    def __init__(self, *args, **kwargs):
-        super(AttendanceForm, self).__init__(*args, **kwargs)
-        self.member.choices = [(m.id, m.name) for m in Member.query.order_by('name').all()]
-        self.member.choices.insert(0, (0, 'Select a member'))
-
 class TrainerForm(FlaskForm):
     name = StringField('Trainer Name', validators=[DataRequired()])
     specialization = StringField('Specialization', validators=[Optional()])
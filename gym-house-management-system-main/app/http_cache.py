@@ -0,0 +1,88 @@
+import hashlib
+import secrets
+import time
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from app.cache import LRUCache, table_version
+from app.database import replica_version, routes_to_replica
+
+# Conditional GETs for pages that only change when a few tables do. A page's
+# ETag is derived from the version counters of the tables it shows (bumped
+# on every commit that writes them, see app.cache), the URL and who is
+# asking, so a matching If-None-Match is answered with 304 before the view
+# runs and without any query. Rendered pages for anonymous visitors are
+# also kept in a small LRU cache.
+#
+# The counters are per process, so ETags also carry a process id and a time
+# bucket of HTTP_CACHE_REVALIDATE_SECONDS: a write made by another worker is
+# seen once the bucket rolls over, as with the other in-process caches.
+# Pages a @use_replica view reads from a replica may predate those
+# counters, so their ETags carry the replica's version instead
+# (app/database.py).
+
+_PROCESS_ID = secrets.token_hex(8)
+_pages = LRUCache(maxsize=128)
+
+
+def _etag(view, tables, user):
+    bucket = int(time.time() // current_app.config['HTTP_CACHE_REVALIDATE_SECONDS'])
+    if getattr(view, 'reads_replica', False) and routes_to_replica():
+        version = replica_version()
+    else:
+        version = table_version(*tables)
+    key = (_PROCESS_ID, bucket, request.endpoint, request.full_path, user, version)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def cached_page(*tables, public=False):
+    """Answer GETs of the decorated view with ETag/304 revalidation.
+
+    `tables` are the tables the page's content comes from. A `public` page
+    is shared by all anonymous visitors: their responses are cacheable by
+    browsers and proxies for HTTP_CACHE_PUBLIC_MAX_AGE seconds and kept
+    rendered in memory. Everything else is `private, no-cache`, i.e.
+    revalidated on every use. Put it below @roles_required so access is
+    checked first.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            config = current_app.config
+            # Pending flash messages are part of the next page rendered
+            if not config['HTTP_CACHE_ENABLED'] or request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            anonymous = not current_user.is_authenticated
+            shared = public and anonymous
+            etag = _etag(view, tables, None if anonymous else current_user.get_id())
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                cached = _pages.get(request.full_path) if shared else None
+                if cached is not None and cached[0] == etag:
+                    response = make_response(cached[1])
+                    response.mimetype = cached[2]
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if shared:
+                        _pages.set(request.full_path, (etag, response.get_data(), response.mimetype))
+
+            response.set_etag(etag)
+            if shared:
+                response.cache_control.public = True
+                response.cache_control.max_age = config['HTTP_CACHE_PUBLIC_MAX_AGE']
+            else:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            # Logging in or out changes the page
+            response.vary.add('Cookie')
+            return response
+        return wrapped
+    return decorator
+
+
+def init_app(app):
+    _pages.maxsize = app.config['HTTP_CACHE_PAGES']
@@ -0,0 +1,25 @@
+from flask import current_app
+from app import db
+from app.cache import TTLCache
+from app.database import cache_version
+
+# Plans, trainers and workout plans are small and change rarely, but every
+# member/payment form needs them as select choices. Choices are cached per
+# table and reused until that table's write version moves on. The TTL bounds
+# staleness for writes made by other worker processes.
+_cache = TTLCache(ttl=60)
+
+
+def lookup_choices(model):
+    """(id, name) pairs for `model`, ordered by name."""
+    table = model.__tablename__
+    _cache.ttl = current_app.config['LOOKUP_CACHE_TTL']
+    version = cache_version(table)
+    cached = _cache.get(table)
+    if cached is not None and cached[0] == version:
+        return list(cached[1])
+
+    choices = db.session.execute(db.select(model.id, model.name).order_by(model.name)).all()
+    choices = [(row.id, row.name) for row in choices]
+    _cache.set(table, (version, choices))
+    return list(choices)
@@ -1,8 +1,18 @@
+import hashlib
 from datetime import datetime, timedelta
-from app import db, bcrypt # Import bcrypt
+from app import db
 from flask_login import UserMixin # Import UserMixin
+from app.services.hashing import get_password_hasher
+from app.money import Cents
 
 class Member(db.Model):
+    __table_args__ = (
+        db.Index('ix_member_join_date', 'join_date'),
+        db.Index('ix_member_membership_end_date', 'membership_end_date'),
+        db.Index('ix_member_status_end_date', 'membership_status', 'membership_end_date'),
+        db.Index('ix_member_status_join_date', 'membership_status', 'join_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -12,6 +22,10 @@ class Member(db.Model):
     membership_plan_id = db.Column(db.Integer, db.ForeignKey('membership_plan.id'))
     membership_start_date = db.Column(db.Date)
     membership_end_date = db.Column(db.Date)
+    # Denormalized from membership_end_date: 'active', 'expiring', 'expired'
+    # or 'none'. Set on every write and moved along daily by
+    # `flask refresh-memberships` (app/services/memberships.py).
+    membership_status = db.Column(db.String(10), nullable=False, default='none', server_default='none')
     
     trainer_id = db.Column(db.Integer, db.ForeignKey('trainer.id'))
     workout_plan_id = db.Column(db.Integer, db.ForeignKey('workout_plan.id'))
@@ -27,11 +41,15 @@ class Member(db.Model):
     def __repr__(self):
         return f'<Member {self.name}>'
 
+# Case-insensitive prefix search for the member picker
+db.Index('ix_member_name_lower', db.func.lower(Member.name))
+db.Index('ix_member_email_lower', db.func.lower(Member.email))
+
 class MembershipPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False, unique=True)
     duration_days = db.Column(db.Integer, nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column('price_cents', Cents, key='price', nullable=False)
     
     members = db.relationship('Member', backref='membership_plan', lazy='dynamic')
 
@@ -39,9 +57,14 @@ class MembershipPlan(db.Model):
         return f'<MembershipPlan {self.name}>'
 
 class Payment(db.Model):
+    __table_args__ = (
+        db.Index('ix_payment_payment_date', 'payment_date'),
+        db.Index('ix_payment_member_id_payment_date', 'member_id', 'payment_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     member_id = db.Column(db.Integer, db.ForeignKey('member.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column('amount_cents', Cents, key='amount', nullable=False)
     payment_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     plan_id = db.Column(db.Integer, db.ForeignKey('membership_plan.id'))
 
@@ -51,6 +74,11 @@ class Payment(db.Model):
         return f'<Payment {self.id}>'
 
 class Attendance(db.Model):
+    __table_args__ = (
+        db.Index('ix_attendance_check_in_time', 'check_in_time'),
+        db.Index('ix_attendance_member_id_check_in_time', 'member_id', 'check_in_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     member_id = db.Column(db.Integer, db.ForeignKey('member.id'), nullable=False)
     check_in_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -59,6 +87,75 @@ class Attendance(db.Model):
     def __repr__(self):
         return f'<Attendance for Member {self.member_id} at {self.check_in_time}>'
 
+# Open visits only (no check-out yet): the front desk list, live occupancy
+# and the auto-close job read this instead of the whole attendance table.
+db.Index('ix_attendance_open', Attendance.check_in_time,
+         sqlite_where=Attendance.check_out_time.is_(None),
+         postgresql_where=Attendance.check_out_time.is_(None))
+
+class AttendanceRollup(db.Model):
+    # Check-ins per day and hour of day, kept in step with Attendance by
+    # app/services/rollups.py. Reports read this instead of scanning check-ins.
+    day = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    check_ins = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AttendanceRollup {self.day} {self.hour:02d}h: {self.check_ins}>'
+
+class RevenueRollup(db.Model):
+    # Payment count and amount per day and plan (plan_id 0 = no plan)
+    day = db.Column(db.Date, primary_key=True)
+    plan_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column('amount_cents', Cents, key='amount', nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<RevenueRollup {self.day} plan {self.plan_id}: {self.amount}>'
+
+class RenewalNotice(db.Model):
+    # One per member, membership end date and kind ('expiring' or 'expired'),
+    # recorded by the membership refresh job for reminders to pick up.
+    __table_args__ = (
+        db.UniqueConstraint('member_id', 'membership_end_date', 'kind', name='uq_renewal_notice'),
+        db.Index('ix_renewal_notice_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    member_id = db.Column(db.Integer, db.ForeignKey('member.id'), nullable=False)
+    membership_end_date = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    member = db.relationship('Member')
+
+    def __repr__(self):
+        return f'<RenewalNotice {self.kind} for Member {self.member_id}>'
+
+class Notification(db.Model):
+    # Outbox of messages to members, written in the same transaction as what
+    # caused them and sent by `flask deliver-notifications`. `dedupe_key` makes
+    # queueing the same reminder or receipt twice a no-op.
+    __table_args__ = (
+        db.Index('ix_notification_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    dedupe_key = db.Column(db.String(100), unique=True, nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Notification {self.kind} to {self.recipient}>'
+
 class Trainer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -82,17 +179,30 @@ class WorkoutPlan(db.Model):
         return f'<WorkoutPlan {self.name}>'
 
 class Inquiry(db.Model):
+    __table_args__ = (
+        db.Index('ix_inquiry_submitted_at', 'submitted_at'),
+        db.Index('ix_inquiry_content_hash', 'content_hash'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
     message = db.Column(db.Text)
     submitted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # sha256 of the normalized email and message, for spotting resubmissions
+    # (app/services/inquiries.py)
+    content_hash = db.Column(db.String(64))
 
     def __repr__(self):
         return f'<Inquiry {self.name}>'
 
 class User(db.Model, UserMixin):
+    # username and email are already indexed by their unique constraints
+    __table_args__ = (
+        db.Index('ix_user_member_id', 'member_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -102,10 +212,23 @@ class User(db.Model, UserMixin):
     member = db.relationship('Member', backref='user', uselist=False) # Relationship
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
+
+    def needs_rehash(self):
+        # True when the stored hash was made with a different BCRYPT_LOG_ROUNDS
+        return get_password_hasher().needs_rehash(self.password_hash)
+
+    @staticmethod
+    def stamp_for(password_hash, role):
+        # Changes whenever the password or role does; see app/auth.py
+        return hashlib.sha256(f'{role}:{password_hash}'.encode()).hexdigest()[:16]
+
+    def get_id(self):
+        # Flask-Login's session id: user id plus credential stamp
+        return f'{self.id}:{self.stamp_for(self.password_hash, self.role)}'
 
     def __repr__(self):
         return f'<User {self.username}>'
\ No newline at end of file
@@ -0,0 +1,46 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from app import db
+
+# Money is stored as integer minor units (cents). Columns of type Cents read
+# and write Decimal amounts with two places, so the rest of the app keeps
+# working in currency units, while the database only ever stores, compares
+# and sums integers: SUM() over a Cents column is exact and comes back as a
+# Decimal.
+
+CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    """Integer cents for an amount given as Decimal, int, float or string.
+
+    Rounds half up to the nearest cent. Floats go through their shortest
+    repr, so 19.99 becomes 1999 rather than 1998.
+    """
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        return int(Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP).scaleb(2))
+    except InvalidOperation:
+        raise ValueError(f'not an amount of money: {value!r}')
+
+
+def from_cents(cents):
+    return None if cents is None else Decimal(int(cents)).scaleb(-2)
+
+
+class Cents(db.TypeDecorator):
+    """Integer cents in the database, Decimal currency units in Python."""
+
+    impl = db.BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return from_cents(value)
+
+
+def raw_cents(column):
+    """`column` read as plain integer cents, e.g. for loading into arrays."""
+    return db.type_coerce(column, db.BigInteger)
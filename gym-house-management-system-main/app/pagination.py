@@ -0,0 +1,68 @@
+from datetime import date, datetime
+from flask import abort, current_app, request
+from app import db
+
+
+class KeysetPage:
+    """One page of a keyset-paginated query, newest rows first."""
+
+    def __init__(self, items, per_page, next_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _encode_cursor(sort_value, row_id):
+    return f'{sort_value.isoformat()}_{row_id}'
+
+
+def cursor_starting_at(sort_value, row_id):
+    # Cursors point just past a row; one past (sort_value, row_id + 1) makes
+    # that row the first of the page, for links to a particular row.
+    return _encode_cursor(sort_value, row_id + 1)
+
+
+def _decode_cursor(cursor, sort_column):
+    try:
+        raw_value, raw_id = cursor.rsplit('_', 1)
+        if isinstance(sort_column.type, db.DateTime):
+            sort_value = datetime.fromisoformat(raw_value)
+        else:
+            sort_value = date.fromisoformat(raw_value)
+        return sort_value, int(raw_id)
+    except ValueError:
+        abort(400)
+
+
+def get_per_page():
+    per_page = request.args.get('per_page', type=int) or current_app.config['ITEMS_PER_PAGE']
+    return max(1, min(per_page, current_app.config['MAX_ITEMS_PER_PAGE']))
+
+
+def keyset_query(query, sort_column, id_column, cursor=None):
+    # Seek past the last row of the previous page on (sort_column, id) instead
+    # of using OFFSET, so every page costs the same regardless of its depth.
+    # The redundant `<=` bound lets the planner seek the index before applying
+    # the tie-break on id.
+    if cursor:
+        sort_value, row_id = _decode_cursor(cursor, sort_column)
+        query = query.filter(
+            sort_column <= sort_value,
+            db.or_(sort_column < sort_value, id_column < row_id)
+        )
+    return query.order_by(sort_column.desc(), id_column.desc())
+
+
+def paginate_keyset(query, sort_column, id_column, cursor=None, per_page=None):
+    per_page = per_page or get_per_page()
+    rows = keyset_query(query, sort_column, id_column, cursor).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = _encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return KeysetPage(rows, per_page, next_cursor)
@@ -0,0 +1,134 @@
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+
+class QueryCount:
+    """Statements seen while a `count_queries()` block is open."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+class RouteStats:
+    """Per-endpoint totals of requests, queries and DB time in this process."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, queries, db_time, slow):
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time_ms': 0.0, 'slow_queries': 0
+            })
+            route['requests'] += 1
+            route['queries'] += queries
+            route['max_queries'] = max(route['max_queries'], queries)
+            route['db_time_ms'] += db_time * 1000
+            route['slow_queries'] += slow
+
+    def snapshot(self):
+        with self._lock:
+            routes = {endpoint: dict(route) for endpoint, route in self._routes.items()}
+        for route in routes.values():
+            route['avg_queries'] = route['queries'] / route['requests']
+            route['avg_db_time_ms'] = route['db_time_ms'] / route['requests']
+        return routes
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+_counters = []
+_counters_lock = threading.Lock()
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement run (on any thread) inside the block."""
+    counter = QueryCount()
+    with _counters_lock:
+        _counters.append(counter)
+    try:
+        yield counter
+    finally:
+        with _counters_lock:
+            _counters.remove(counter)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """Fail if the block runs more than `max_queries` statements, e.g.
+
+        with assert_max_queries(3):
+            client.get('/members')
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise AssertionError(f'{counter.count} queries run, expected at most {max_queries}:\n'
+                             + '\n'.join(counter.statements))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    if _counters:
+        with _counters_lock:
+            for counter in _counters:
+                counter.statements.append(statement)
+    if not has_request_context():
+        return
+
+    g.query_count = g.get('query_count', 0) + 1
+    g.query_time = g.get('query_time', 0.0) + elapsed
+    if elapsed * 1000 >= current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+        g.slow_query_count = g.get('slow_query_count', 0) + 1
+        current_app.logger.warning('Slow query (%.1f ms) in %s %s: %s',
+                                   elapsed * 1000, request.method, request.endpoint, statement)
+
+
+def _handle_error(context):
+    # after_cursor_execute doesn't run for a failed statement
+    if context.connection is not None and context.connection.info.get('query_start_time'):
+        context.connection.info['query_start_time'].pop()
+
+
+def _reset_request_stats():
+    # g outlives the request when a caller already holds an app context
+    g.query_count, g.query_time, g.slow_query_count = 0, 0.0, 0
+
+
+def _record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    queries, db_time = g.query_count, g.query_time
+    route_stats.record(endpoint, queries, db_time, g.slow_query_count)
+    if current_app.config['QUERY_STATS_HEADERS'] or current_app.debug:
+        response.headers['X-Query-Count'] = str(queries)
+        response.headers['X-Query-Time-Ms'] = f'{db_time * 1000:.1f}'
+    return response
+
+
+def init_app(app, db):
+    """Count queries and DB time per request and log slow statements."""
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_reset_request_stats)
+    app.after_request(_record_request)
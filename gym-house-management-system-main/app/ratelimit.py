@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+# Token-bucket rate limiting. Each key (e.g. a client address) has a bucket
+# of `capacity` tokens refilled at `rate` tokens per second; a request takes
+# one token or is refused until the next one is due.
+#
+# Buckets live in a store selected by RATE_LIMIT_STORE. The 'memory' store
+# keeps them in this process, so with several workers each enforces its own
+# limit. A shared store (Redis, memcached) only has to provide the same
+# take() atomically and be registered in RATE_LIMIT_STORES.
+
+
+class MemoryRateLimitStore:
+    """Token buckets in process memory, for at most `max_keys` keys (least
+    recently seen dropped first; a dropped bucket starts full again)."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, now=None):
+        """Take a token from `key`'s bucket; returns (allowed, seconds until
+        a token is available if not)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+RATE_LIMIT_STORES = {'memory': lambda config: MemoryRateLimitStore(config['RATE_LIMIT_MAX_KEYS'])}
+
+
+def get_rate_limit_store():
+    app = current_app._get_current_object()
+    store = app.extensions.get('rate_limit_store')
+    if store is None:
+        store = RATE_LIMIT_STORES[app.config['RATE_LIMIT_STORE']](app.config)
+        app.extensions['rate_limit_store'] = store
+    return store
+
+
+def check_rate_limit(scope, key, per_hour, burst):
+    """Take a token for `key` in `scope` (allowing `burst` at once and
+    `per_hour` sustained); returns (allowed, retry_after_seconds)."""
+    return get_rate_limit_store().take(f'{scope}:{key}', per_hour / 3600, burst)
@@ -1,14 +1,33 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, make_response
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, make_response, jsonify, current_app, Response, stream_with_context
 from app import db, bcrypt
 from app.models import Member, MembershipPlan, Trainer, WorkoutPlan, Payment, Attendance, User, Inquiry
 from app.forms import MemberForm, MembershipPlanForm, PaymentForm, AttendanceForm, TrainerForm, WorkoutPlanForm, LoginForm, AdminRegistrationForm, MemberAndUserForm, InquiryForm
+import math
 from datetime import datetime, timedelta
 from flask_login import login_user, current_user, logout_user, login_required
+from app.auth import ADMIN, SUBSCRIPTION, roles_required, can_access_member
+from app.http_cache import cached_page
+from app.database import use_replica
+from sqlalchemy.orm import joinedload
+from app.pagination import paginate_keyset, cursor_starting_at
+from app.services.dashboard import get_dashboard_stats
+from app.services.members import search_members, get_member_summary_html, member_history_page, MEMBER_HISTORY
+from app.services.checkin import record_scans
+from app.services.export import EXPORTS, FORMATS
+from app.profiling import route_stats
+from app.services.occupancy import get_occupancy
+from app.services.revenue import get_revenue_report
+from app.services.visits import open_visits_query, live_occupancy
+from app.services.memberships import MEMBERSHIP_STATUSES
+from app.services.ledger import record_payment, MembershipConflict
+from app.services.search import search as full_text_search
+from app.services.inquiries import submit_inquiry, RATE_LIMITED, BUSY
 
 bp = Blueprint('main', __name__)
 
 @bp.route('/')
 @bp.route('/home')
+@cached_page(public=True)
 def home():
     # This will be the public marketing page
     return render_template('home.html', title='Welcome to Gym House')
@@ -17,14 +36,17 @@ def home():
 def inquiry():
     form = InquiryForm()
     if form.validate_on_submit():
-        inquiry = Inquiry(
-            name=form.name.data,
-            email=form.email.data,
-            phone=form.phone.data,
-            message=form.message.data
-        )
-        db.session.add(inquiry)
-        db.session.commit()
+        status, retry_after = submit_inquiry(form.name.data, form.email.data, form.phone.data,
+                                             form.message.data, client=request.remote_addr)
+        if status == RATE_LIMITED:
+            flash('Too many inquiries from your address. Please try again later.', 'warning')
+            response = make_response(render_template('inquiry.html', title='Submit Inquiry', form=form), 429)
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response
+        if status == BUSY:
+            flash('We could not take your inquiry right now. Please try again in a few minutes.', 'danger')
+            return render_template('inquiry.html', title='Submit Inquiry', form=form), 503
+        # Duplicates get the same answer, so resubmitting tells a bot nothing
         flash('Your inquiry has been submitted successfully!', 'success')
         return redirect(url_for('main.home'))
     return render_template('inquiry.html', title='Submit Inquiry', form=form)
@@ -34,11 +56,8 @@ def inquiry():
 
 
 @bp.route('/admin/create_admin', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def create_admin():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = AdminRegistrationForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data, role='admin')
@@ -57,7 +76,7 @@ def create_admin():
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        if current_user.role == 'admin':
+        if current_user.role == ADMIN:
             return redirect(url_for('main.dashboard'))
         else:
             return redirect(url_for('main.home'))
@@ -65,6 +84,10 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            if user.needs_rehash():
+                # Bring the hash up to the configured cost while we have the password
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             if user.role == 'admin':
@@ -84,60 +107,88 @@ def logout():
 
 # --- Admin Dashboard (Protected) ---
 @bp.route('/dashboard')
-@login_required
+@roles_required(ADMIN)
+@use_replica
 def dashboard():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
-
-    total_members = Member.query.count()
-    active_members = Member.query.filter(Member.membership_end_date >= datetime.utcnow().date()).count()
-    
-    today = datetime.utcnow().date()
-    today_checkins = Attendance.query.filter(
-        db.func.date(Attendance.check_in_time) == today
-    ).count()
-
-    total_revenue = db.session.query(db.func.sum(Payment.amount)).scalar() or 0
-    inquiries_count = Inquiry.query.count()
-
-    expiring_members = Member.query.filter(
-        Member.membership_end_date >= today,
-        Member.membership_end_date <= today + timedelta(days=7)
-    ).all()
-
-    members_needing_renewal = Member.query.filter(
-        Member.membership_end_date < today,
-        Member.membership_end_date != None
-    ).all()
-
-    return render_template('admin_dashboard.html', title='Admin Dashboard', 
-                           total_members=total_members,
-                           active_members=active_members,
-                           today_checkins=today_checkins,
-                           total_revenue=total_revenue,
-                           inquiries_count=inquiries_count,
-                           expiring_members=expiring_members,
-                           members_needing_renewal=members_needing_renewal)
+    stats = get_dashboard_stats()
+    return render_template('admin_dashboard.html', title='Admin Dashboard', **stats)
 
 @bp.route('/admin/inquiries')
-@login_required
+@roles_required(ADMIN)
+@use_replica
 def list_inquiries():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
-    inquiries = Inquiry.query.order_by(Inquiry.submitted_at.desc()).all()
-    return render_template('admin/inquiries.html', title='Inquiries', inquiries=inquiries)
+    cursor = request.args.get('cursor')
+    # ?inquiry=<id> opens the page starting at that inquiry (search results)
+    inquiry_id = request.args.get('inquiry', type=int)
+    if inquiry_id and not cursor:
+        inquiry = Inquiry.query.get_or_404(inquiry_id)
+        cursor = cursor_starting_at(inquiry.submitted_at, inquiry.id)
+    page = paginate_keyset(Inquiry.query, Inquiry.submitted_at, Inquiry.id, cursor)
+    return render_template('admin/inquiries.html', title='Inquiries', inquiries=page.items, page=page)
+
+@bp.route('/admin/query_stats')
+@roles_required(ADMIN, flash_denied=False)
+def query_stats():
+    # Per-route query counts and DB time for this worker process, worst first
+    routes = route_stats.snapshot()
+    return jsonify({
+        'slow_query_threshold_ms': current_app.config['SLOW_QUERY_THRESHOLD_MS'],
+        'routes': [dict(route, endpoint=endpoint) for endpoint, route in
+                   sorted(routes.items(), key=lambda item: item[1]['db_time_ms'], reverse=True)],
+    })
+
+@bp.route('/admin/analytics/occupancy')
+@roles_required(ADMIN, flash_denied=False)
+@use_replica
+def occupancy_analytics():
+    # Occupancy curve, weekday/hour heatmaps and visit durations; defaults
+    # to the last year at hourly resolution.
+    today = datetime.utcnow().date()
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+        start = (datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start')
+                 else end - timedelta(days=364))
+    except ValueError:
+        abort(400)
+    step = request.args.get('step', 60, type=int)
+    if start > end or not 5 <= step <= 24 * 60:
+        abort(400)
+    # The curve holds one sample per step over the whole range
+    if ((end - start).days + 1) * 24 * 60 // step > current_app.config['OCCUPANCY_MAX_POINTS']:
+        abort(400)
+    return jsonify(get_occupancy(start, end, step))
+
+@bp.route('/admin/reports/revenue')
+@roles_required(ADMIN, flash_denied=False)
+@use_replica
+def revenue_report():
+    # Monthly revenue, MRR, churn and growth, per-plan revenue and lifetime
+    # value; defaults to the last twelve months.
+    today = datetime.utcnow().date()
+    try:
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+        start = (datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start')
+                 else (end.replace(day=1) - timedelta(days=334)).replace(day=1))
+    except ValueError:
+        abort(400)
+    if start > end or (end - start).days >= current_app.config['REVENUE_REPORT_MAX_DAYS']:
+        abort(400)
+    return jsonify(get_revenue_report(start, end))
 
 @bp.route('/admin/create_member_and_user', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def create_member_and_user():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = MemberAndUserForm()
     if form.validate_on_submit():
-        member = Member(
+        # Hash before writing anything, then add both rows in one commit so
+        # a failure can't leave a member without its account
+        user = User(
+            username=form.username.data,
+            email=form.email.data,
+            role='subscription'
+        )
+        user.set_password(form.password.data)
+        user.member = Member(
             name=form.name.data,
             email=form.email.data,
             phone=form.phone.data,
@@ -148,16 +199,6 @@ def create_member_and_user():
             trainer_id=form.trainer.data if form.trainer.data != 0 else None,
             workout_plan_id=form.workout_plan.data if form.workout_plan.data != 0 else None
         )
-        db.session.add(member)
-        db.session.commit()
-
-        user = User(
-            username=form.username.data,
-            email=form.email.data,
-            role='subscription'
-        )
-        user.set_password(form.password.data)
-        user.member_id = member.id
         db.session.add(user)
         db.session.commit()
 
@@ -168,21 +209,52 @@ def create_member_and_user():
 # --- Member Management Routes ---
 
 @bp.route('/members')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@use_replica
 def list_members():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
-    members = Member.query.all()
-    return render_template('members/list.html', title='Members', members=members)
+    query = Member.query
+    status = request.args.get('status')
+    if status in MEMBERSHIP_STATUSES:
+        query = query.filter(Member.membership_status == status)
+    page = paginate_keyset(query, Member.join_date, Member.id, request.args.get('cursor'))
+    return render_template('members/list.html', title='Members', members=page.items, page=page,
+                           status=status, statuses=MEMBERSHIP_STATUSES)
+
+@bp.route('/members/search')
+@roles_required(ADMIN, flash_denied=False)
+def member_search():
+    # JSON type-ahead for the member picker on the payment and check-in forms
+    rows = search_members(request.args.get('q', ''), current_app.config['MEMBER_SEARCH_LIMIT'])
+    return jsonify([{'id': row.id, 'name': row.name, 'email': row.email} for row in rows])
+
+# Where each kind of search result links to
+SEARCH_RESULT_URLS = {
+    'member': lambda ref_id: url_for('main.view_member', member_id=ref_id),
+    'inquiry': lambda ref_id: url_for('main.list_inquiries', inquiry=ref_id, _anchor=f'inquiry-{ref_id}'),
+    'trainer': lambda ref_id: url_for('main.edit_trainer', trainer_id=ref_id),
+    'workout_plan': lambda ref_id: url_for('main.edit_workout_plan', plan_id=ref_id),
+}
+
+@bp.route('/search')
+@roles_required(ADMIN, flash_denied=False)
+@use_replica
+def search():
+    # Ranked JSON full-text search; `kind` (repeatable) narrows the result types
+    kinds = [kind for kind in request.args.getlist('kind') if kind in SEARCH_RESULT_URLS]
+    limit = request.args.get('limit', type=int) or current_app.config['SEARCH_RESULT_LIMIT']
+    limit = max(1, min(limit, current_app.config['SEARCH_MAX_RESULTS']))
+    query = request.args.get('q', '')
+    rows = full_text_search(query, kinds, limit)
+    if rows is None:
+        abort(501)
+    return jsonify({'query': query, 'results': [
+        {'kind': row.kind, 'id': row.ref_id, 'title': row.title, 'snippet': row.snippet,
+         'url': SEARCH_RESULT_URLS[row.kind](row.ref_id)} for row in rows
+    ]})
 
 @bp.route('/members/add', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def add_member():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = MemberForm()
     if form.validate_on_submit():
         member = Member(
@@ -203,26 +275,40 @@ def add_member():
     return render_template('members/form.html', title='Add Member', form=form)
 
 @bp.route('/members/<int:member_id>')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@use_replica
 def view_member(member_id):
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
-    member = Member.query.get_or_404(member_id)
     # Subscription users can only view their own profile
-    if current_user.role == 'subscription' and member.email != current_user.email:
+    if not can_access_member(member_id):
         flash('Access denied. You can only view your own profile.', 'danger')
         abort(403)
 
-    return render_template('members/profile.html', title=f'Member: {member.name}', member=member)
+    member = Member.query.options(
+        joinedload(Member.membership_plan), joinedload(Member.trainer), joinedload(Member.workout_plan)
+    ).filter_by(id=member_id).first_or_404()
+
+    return render_template('members/profile.html', title=f'Member: {member.name}', member=member,
+                           summary=get_member_summary_html(member.id),
+                           payments=member_history_page(member.id, 'payments'),
+                           attendances=member_history_page(member.id, 'attendance'))
+
+@bp.route('/members/<int:member_id>/history/<kind>')
+@roles_required(ADMIN, SUBSCRIPTION, flash_denied=False)
+@use_replica
+def member_history(member_id, kind):
+    if kind not in MEMBER_HISTORY:
+        abort(404)
+    if not can_access_member(member_id):
+        abort(403)
+    member = Member.query.get_or_404(member_id)
+
+    # "Load more" fragment: the next page of list items for the profile
+    page = member_history_page(member.id, kind, request.args.get('cursor'))
+    return render_template('members/_history.html', kind=kind, page=page, member_id=member.id)
 
 @bp.route('/members/edit/<int:member_id>', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def edit_member(member_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     member = Member.query.get_or_404(member_id)
     form = MemberForm(obj=member)
     if form.validate_on_submit():
@@ -241,11 +327,8 @@ def edit_member(member_id):
     return render_template('members/form.html', title=f'Edit Member: {member.name}', form=form, member=member)
 
 @bp.route('/members/export/<int:member_id>')
-@login_required
+@roles_required(ADMIN)
 def export_member(member_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     member = Member.query.get_or_404(member_id)
     
     # Create a string with member details
@@ -279,12 +362,29 @@ def export_member(member_id):
     
     return response
 
+@bp.route('/admin/export/<kind>.<fmt>')
+@roles_required(ADMIN)
+def bulk_export(kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        abort(400)
+
+    # Rows are written out chunk by chunk as they come off the cursor rather
+    # than building the whole file in memory.
+    iter_rows, mimetype = FORMATS[fmt]
+    rows = iter_rows(kind, start=start, end=end, member_id=request.args.get('member_id', type=int),
+                     chunk_size=current_app.config['EXPORT_CHUNK_SIZE'])
+    response = Response(stream_with_context(rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
 @bp.route('/members/delete/<int:member_id>', methods=['POST'])
-@login_required
+@roles_required(ADMIN)
 def delete_member(member_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     member = Member.query.get_or_404(member_id)
     db.session.delete(member)
     db.session.commit()
@@ -294,20 +394,16 @@ def delete_member(member_id):
 # --- Membership Plan Management Routes ---
 
 @bp.route('/plans')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@cached_page('membership_plan')
+@use_replica
 def list_plans():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
     plans = MembershipPlan.query.all()
     return render_template('plans/list.html', title='Membership Plans', plans=plans)
 
 @bp.route('/plans/add', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def add_plan():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = MembershipPlanForm()
     if form.validate_on_submit():
         plan = MembershipPlan(
@@ -322,11 +418,8 @@ def add_plan():
     return render_template('plans/form.html', title='Add Membership Plan', form=form)
 
 @bp.route('/plans/edit/<int:plan_id>', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def edit_plan(plan_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     plan = MembershipPlan.query.get_or_404(plan_id)
     form = MembershipPlanForm(obj=plan)
     if form.validate_on_submit():
@@ -339,14 +432,14 @@ def edit_plan(plan_id):
     return render_template('plans/form.html', title=f'Edit Membership Plan: {plan.name}', form=form)
 
 @bp.route('/plans/delete/<int:plan_id>', methods=['POST'])
-@login_required
+@roles_required(ADMIN)
 def delete_plan(plan_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     plan = MembershipPlan.query.get_or_404(plan_id)
     if plan.members.count() > 0:
         flash('Cannot delete plan: Members are currently assigned to it.', 'danger')
+    elif db.session.execute(db.select(Payment.id).filter_by(plan_id=plan.id).limit(1)).first():
+        # Payments keep their plan for the revenue reports
+        flash('Cannot delete plan: Payments have been recorded for it.', 'danger')
     else:
         db.session.delete(plan)
         db.session.commit()
@@ -356,57 +449,29 @@ def delete_plan(plan_id):
 # --- Payment Management Routes ---
 
 @bp.route('/payments')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@use_replica
 def list_payments():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
-    if current_user.role == 'subscription':
-        member = Member.query.filter_by(email=current_user.email).first()
-        if member:
-            payments = Payment.query.filter_by(member_id=member.id).order_by(Payment.payment_date.desc()).all()
-        else:
-            payments = []
-    else: # Admin
-        payments = Payment.query.order_by(Payment.payment_date.desc()).all()
-    
-    return render_template('payments/list.html', title='Payments', payments=payments)
+    # Load member and plan in the same query so the template doesn't lazy-load per row
+    query = Payment.query.options(joinedload(Payment.member), joinedload(Payment.plan))
+    if current_user.role == SUBSCRIPTION:
+        query = query.filter(Payment.member_id == current_user.member_id)
+
+    page = paginate_keyset(query, Payment.payment_date, Payment.id, request.args.get('cursor'))
+    return render_template('payments/list.html', title='Payments', payments=page.items, page=page)
 
 @bp.route('/payments/add', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def add_payment():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = PaymentForm()
     if form.validate_on_submit():
-        member = Member.query.get(form.member.data)
-        if not member:
-            flash('Selected member does not exist.', 'danger')
+        try:
+            record_payment(form.member.data, form.amount.data, form.payment_date.data,
+                           plan_id=form.membership_plan.data if form.membership_plan.data != 0 else None)
+        except MembershipConflict:
+            current_app.logger.exception('Failed to record payment for member %s', form.member.data)
+            flash('The payment could not be recorded because the member was being updated. Please try again.', 'danger')
             return render_template('payments/form.html', title='Record Payment', form=form)
-
-        payment = Payment(
-            member_id=form.member.data,
-            amount=form.amount.data,
-            payment_date=form.payment_date.data,
-            plan_id=form.membership_plan.data if form.membership_plan.data != 0 else None
-        )
-        db.session.add(payment)
-        
-        if payment.plan_id:
-            membership_plan = MembershipPlan.query.get(payment.plan_id)
-            if membership_plan:
-                if not member.membership_start_date:
-                    member.membership_start_date = payment.payment_date
-                    member.membership_end_date = payment.payment_date + timedelta(days=membership_plan.duration_days)
-                elif member.membership_end_date and member.membership_end_date >= payment.payment_date:
-                    member.membership_end_date += timedelta(days=membership_plan.duration_days)
-                else:
-                    member.membership_start_date = payment.payment_date
-                    member.membership_end_date = payment.payment_date + timedelta(days=membership_plan.duration_days)
-        
-        db.session.commit()
         flash('Payment recorded successfully!', 'success')
         return redirect(url_for('main.list_payments'))
     return render_template('payments/form.html', title='Record Payment', form=form)
@@ -414,36 +479,39 @@ def add_payment():
 # --- Attendance Tracking Routes ---
 
 @bp.route('/attendance')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@use_replica
 def list_attendance():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
-    if current_user.role == 'subscription':
-        member = Member.query.filter_by(email=current_user.email).first()
-        if member:
-            attendance_records = Attendance.query.filter_by(member_id=member.id).order_by(Attendance.check_in_time.desc()).all()
-        else:
-            attendance_records = []
-    else: # Admin
-        attendance_records = Attendance.query.order_by(Attendance.check_in_time.desc()).all()
-    
-    return render_template('attendance/list.html', title='Attendance Records', attendance_records=attendance_records)
+    query = Attendance.query.options(joinedload(Attendance.member))
+    if current_user.role == SUBSCRIPTION:
+        query = query.filter(Attendance.member_id == current_user.member_id)
+
+    page = paginate_keyset(query, Attendance.check_in_time, Attendance.id, request.args.get('cursor'))
+    return render_template('attendance/list.html', title='Attendance Records', attendance_records=page.items, page=page)
+
+@bp.route('/attendance/open')
+@roles_required(ADMIN)
+def open_visits():
+    # Front desk view: only members currently checked in
+    max_age = timedelta(hours=current_app.config['OPEN_VISIT_MAX_HOURS'])
+    query = open_visits_query(max_age).options(joinedload(Attendance.member))
+    page = paginate_keyset(query, Attendance.check_in_time, Attendance.id, request.args.get('cursor'))
+    return render_template('attendance/open.html', title='Checked In Now', visits=page.items, page=page,
+                           occupancy=live_occupancy(max_age))
+
+@bp.route('/api/occupancy/live')
+@roles_required(ADMIN, flash_denied=False)
+def live_occupancy_api():
+    max_age = timedelta(hours=current_app.config['OPEN_VISIT_MAX_HOURS'])
+    return jsonify({'occupancy': live_occupancy(max_age), 'as_of': datetime.utcnow().isoformat()})
 
 @bp.route('/attendance/checkin', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def check_in():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = AttendanceForm()
     if form.validate_on_submit():
-        member = Member.query.get(form.member.data)
-        if not member:
-            flash('Selected member does not exist.', 'danger')
-            return render_template('attendance/checkin_form.html', title='Member Check-in', form=form)
-        
+        member = form.member.member
+
         if not member.is_membership_active():
             flash(f'Member {member.name} does not have an active membership.', 'warning')
             
@@ -457,12 +525,25 @@ def check_in():
         return redirect(url_for('main.list_attendance'))
     return render_template('attendance/checkin_form.html', title='Member Check-in', form=form)
 
+@bp.route('/api/attendance/checkin', methods=['POST'])
+@roles_required(ADMIN, flash_denied=False)
+def api_check_in():
+    # JSON check-in for turnstiles and kiosks. Accepts a single scan
+    # {"member_id": 1, "check_in_time": "..."} or {"scans": [...]}.
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+    scans = payload['scans'] if 'scans' in payload else [payload]
+    if not isinstance(scans, list) or len(scans) > current_app.config['CHECKIN_MAX_SCANS']:
+        return jsonify({'error': f"Send at most {current_app.config['CHECKIN_MAX_SCANS']} scans per request."}), 400
+
+    results = record_scans(scans)
+    checked_in = sum(1 for result in results if result['status'] == 'checked_in')
+    return jsonify({'checked_in': checked_in, 'results': results})
+
 @bp.route('/attendance/checkout/<int:attendance_id>', methods=['POST'])
-@login_required
+@roles_required(ADMIN)
 def check_out(attendance_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     attendance = Attendance.query.get_or_404(attendance_id)
     if not attendance.check_out_time:
         attendance.check_out_time = datetime.utcnow()
@@ -470,27 +551,23 @@ def check_out(attendance_id):
         flash(f'Member {attendance.member.name} checked out successfully!', 'success')
     else:
         flash('Member already checked out.', 'info')
+    if request.form.get('return_to') == 'open':
+        return redirect(url_for('main.open_visits'))
     return redirect(url_for('main.list_attendance'))
 
 # --- Trainer Management Routes ---
 
 @bp.route('/trainers')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@cached_page('trainer')
+@use_replica
 def list_trainers():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
     trainers = Trainer.query.all()
-    
     return render_template('trainers/list.html', title='Trainers', trainers=trainers)
 
 @bp.route('/trainers/add', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def add_trainer():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = TrainerForm()
     if form.validate_on_submit():
         trainer = Trainer(
@@ -505,11 +582,8 @@ def add_trainer():
     return render_template('trainers/form.html', title='Add Trainer', form=form)
 
 @bp.route('/trainers/edit/<int:trainer_id>', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def edit_trainer(trainer_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     trainer = Trainer.query.get_or_404(trainer_id)
     form = TrainerForm(obj=trainer)
     if form.validate_on_submit():
@@ -522,11 +596,8 @@ def edit_trainer(trainer_id):
     return render_template('trainers/form.html', title=f'Edit Trainer: {trainer.name}', form=form)
 
 @bp.route('/trainers/delete/<int:trainer_id>', methods=['POST'])
-@login_required
+@roles_required(ADMIN)
 def delete_trainer(trainer_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     trainer = Trainer.query.get_or_404(trainer_id)
     if trainer.members.count() > 0:
         flash('Cannot delete trainer: Members are currently assigned to them.', 'danger')
@@ -539,22 +610,16 @@ def delete_trainer(trainer_id):
 # --- Workout Plan Management Routes ---
 
 @bp.route('/workout_plans')
-@login_required
+@roles_required(ADMIN, SUBSCRIPTION)
+@cached_page('workout_plan')
+@use_replica
 def list_workout_plans():
-    if current_user.role not in ['admin', 'subscription']:
-        flash('Access denied. Admins and Subscription users only.', 'danger')
-        abort(403)
-    
     workout_plans = WorkoutPlan.query.all()
-    
     return render_template('workout_plans/list.html', title='Workout Plans', workout_plans=workout_plans)
 
 @bp.route('/workout_plans/add', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def add_workout_plan():
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     form = WorkoutPlanForm()
     if form.validate_on_submit():
         workout_plan = WorkoutPlan(
@@ -569,11 +634,8 @@ def add_workout_plan():
     return render_template('workout_plans/form.html', title='Add Workout Plan', form=form)
 
 @bp.route('/workout_plans/edit/<int:plan_id>', methods=['GET', 'POST'])
-@login_required
+@roles_required(ADMIN)
 def edit_workout_plan(plan_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     workout_plan = WorkoutPlan.query.get_or_404(plan_id)
     form = WorkoutPlanForm(obj=workout_plan)
     if form.validate_on_submit():
@@ -586,11 +648,8 @@ def edit_workout_plan(plan_id):
     return render_template('workout_plans/form.html', title=f'Edit Workout Plan: {workout_plan.name}', form=form)
 
 @bp.route('/workout_plans/delete/<int:plan_id>', methods=['POST'])
-@login_required
+@roles_required(ADMIN)
 def delete_workout_plan(plan_id):
-    if current_user.role != 'admin':
-        flash('Access denied. Admins only.', 'danger')
-        abort(403)
     workout_plan = WorkoutPlan.query.get_or_404(plan_id)
     if workout_plan.members.count() > 0:
         flash('Cannot delete workout plan: Members are currently assigned to it.', 'danger')
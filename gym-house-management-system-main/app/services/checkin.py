@@ -0,0 +1,200 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from flask import current_app
+from app import db
+from app.cache import on_tables_written, mark_written
+from app.models import Member, Attendance
+from app.services.rollups import add_check_ins
+from app.services.members import mark_member_history_written
+
+
+class ActiveMemberSet:
+    """Ids of members whose membership is active today, held in memory.
+
+    Loaded with a single query and dropped whenever a member row is written
+    in this process, when the day rolls over, or after `ttl` seconds (which
+    bounds staleness from writes made by other worker processes).
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._ids = None
+        self._loaded_for = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._ids = None
+
+    def _load(self, today):
+        rows = db.session.execute(
+            db.select(Member.id).where(Member.membership_end_date >= today)
+        ).scalars()
+        return frozenset(rows)
+
+    def snapshot(self):
+        today = datetime.utcnow().date()
+        with self._lock:
+            fresh = (self._ids is not None and self._loaded_for == today
+                     and time.monotonic() - self._loaded_at < self.ttl)
+            if not fresh:
+                self._ids = self._load(today)
+                self._loaded_for = today
+                self._loaded_at = time.monotonic()
+            return self._ids
+
+    def __contains__(self, member_id):
+        return member_id in self.snapshot()
+
+
+active_members = ActiveMemberSet()
+
+
+@on_tables_written('member')
+def _invalidate_active_members(tables=None):
+    active_members.invalidate()
+
+
+class CheckInWriter:
+    """Groups attendance inserts from concurrent callers into micro-batches.
+
+    Callers submit rows and block on the returned future; a single writer
+    thread drains the queue for up to `window` seconds or `batch_size` rows
+    and inserts them with one executemany in one transaction. Rows whose
+    future was cancelled (the caller gave up waiting) before the writer
+    picked them up are not written.
+    """
+
+    def __init__(self, app, batch_size=200, window=0.02):
+        self.app = app
+        self.batch_size = batch_size
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkin-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, rows):
+        future = Future()
+        if not rows:
+            future.set_result(0)
+            return future
+        self._ensure_started()
+        self._queue.put((rows, future))
+        return future
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = [(batch, future) for batch, future in self._collect()
+                       if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            rows = [row for batch, _ in pending for row in batch]
+            with self.app.app_context():
+                try:
+                    db.session.execute(db.insert(Attendance), rows)
+                    add_check_ins(db.session, rows)
+                    mark_written(db.session, 'attendance')
+                    mark_member_history_written(db.session, {row['member_id'] for row in rows})
+                    db.session.commit()
+                except Exception as exc:
+                    db.session.rollback()
+                    for _, future in pending:
+                        future.set_exception(exc)
+                    continue
+                finally:
+                    db.session.remove()
+            for batch, future in pending:
+                future.set_result(len(batch))
+
+
+def get_checkin_writer():
+    app = current_app._get_current_object()
+    writer = app.extensions.get('checkin_writer')
+    if writer is None:
+        writer = CheckInWriter(app,
+                               batch_size=app.config['CHECKIN_BATCH_SIZE'],
+                               window=app.config['CHECKIN_BATCH_WINDOW_MS'] / 1000)
+        app.extensions['checkin_writer'] = writer
+    return writer
+
+
+def _parse_scan(scan):
+    member_id = scan.get('member_id') if isinstance(scan, dict) else None
+    if not isinstance(member_id, int) or isinstance(member_id, bool):
+        return None, None
+    check_in_time = scan.get('check_in_time')
+    if check_in_time is None:
+        return member_id, datetime.utcnow()
+    try:
+        check_in_time = datetime.fromisoformat(check_in_time)
+    except (TypeError, ValueError):
+        return member_id, None
+    # Attendance times are naive UTC
+    if check_in_time.tzinfo is not None:
+        check_in_time = check_in_time.astimezone(timezone.utc).replace(tzinfo=None)
+    return member_id, check_in_time
+
+
+def record_scans(scans):
+    """Validate and record a list of badge scans; returns one result per scan.
+
+    Each scan is a dict with `member_id` and an optional ISO `check_in_time`
+    (naive times are taken as UTC). Scans for members without an active
+    membership are refused, not recorded. If the writer does not confirm
+    within CHECKIN_WRITE_TIMEOUT_SECONDS the accepted scans are reported as
+    'error'.
+    """
+    active_members.ttl = current_app.config['ACTIVE_MEMBER_CACHE_TTL']
+    active_ids = active_members.snapshot()
+    results = []
+    rows = []
+    for scan in scans:
+        member_id, check_in_time = _parse_scan(scan)
+        if member_id is None or check_in_time is None:
+            results.append({'member_id': member_id, 'status': 'invalid'})
+        elif member_id not in active_ids:
+            results.append({'member_id': member_id, 'status': 'inactive'})
+        else:
+            results.append({'member_id': member_id, 'status': 'checked_in',
+                            'check_in_time': check_in_time.isoformat()})
+            rows.append({'member_id': member_id, 'check_in_time': check_in_time})
+
+    future = get_checkin_writer().submit(rows)
+    try:
+        future.result(timeout=current_app.config['CHECKIN_WRITE_TIMEOUT_SECONDS'])
+    except Exception:
+        # Not written yet: withdraw the rows so a stalled writer can't record
+        # check-ins reported as failed (too late if it has started on them)
+        future.cancel()
+        current_app.logger.exception('Failed to record %d check-ins', len(rows))
+        for result in results:
+            if result['status'] == 'checked_in':
+                result['status'] = 'error'
+                result.pop('check_in_time')
+    return results
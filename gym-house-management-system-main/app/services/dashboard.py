@@ -0,0 +1,80 @@
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.cache import TTLCache, on_tables_written
+from app.database import cache_version
+from app.models import Member, AttendanceRollup, RevenueRollup, Inquiry
+from app.services.memberships import ACTIVE, EXPIRING, EXPIRED
+
+_cache = TTLCache(ttl=30)
+_CACHE_KEY = 'dashboard_stats'
+_TABLES = ('member', 'payment', 'attendance', 'inquiry', 'attendance_rollup', 'revenue_rollup')
+
+
+@on_tables_written(*_TABLES)
+def invalidate_dashboard_stats(tables=None):
+    _cache.clear()
+
+
+def headline_counts_statement(today):
+    # Every headline number as a scalar subquery of a single SELECT, so the
+    # dashboard costs one round trip. Check-ins and revenue come from the
+    # rollup tables, so their cost grows with days rather than with rows.
+    total_members = db.select(db.func.count(Member.id)).scalar_subquery()
+    active_members = db.select(db.func.count(Member.id)).where(
+        Member.membership_status.in_([ACTIVE, EXPIRING])
+    ).scalar_subquery()
+    today_checkins = db.select(db.func.coalesce(db.func.sum(AttendanceRollup.check_ins), 0)).where(
+        AttendanceRollup.day == today
+    ).scalar_subquery()
+    total_revenue = db.select(db.func.coalesce(db.func.sum(RevenueRollup.amount), 0)).scalar_subquery()
+    inquiries_count = db.select(db.func.count(Inquiry.id)).scalar_subquery()
+
+    return db.select(
+        total_members.label('total_members'),
+        active_members.label('active_members'),
+        today_checkins.label('today_checkins'),
+        total_revenue.label('total_revenue'),
+        inquiries_count.label('inquiries_count'),
+    )
+
+
+def membership_alert_statements(limit):
+    # Served by ix_member_status_end_date; statuses are kept current by the
+    # membership refresh job.
+    columns = (Member.id, Member.name, Member.membership_end_date)
+    expiring = (
+        db.select(*columns)
+        .where(Member.membership_status == EXPIRING)
+        .order_by(Member.membership_end_date, Member.id)
+        .limit(limit)
+    )
+    needing_renewal = (
+        db.select(*columns)
+        .where(Member.membership_status == EXPIRED)
+        .order_by(Member.membership_end_date.desc(), Member.id.desc())
+        .limit(limit)
+    )
+    return expiring, needing_renewal
+
+
+def get_dashboard_stats():
+    """Headline numbers and expiry alerts for the admin dashboard.
+
+    Results are plain rows (not ORM instances) so they can be shared between
+    requests, and are cached for DASHBOARD_CACHE_TTL seconds or until a
+    member, payment, check-in or inquiry is written.
+    """
+    _cache.ttl = current_app.config['DASHBOARD_CACHE_TTL']
+    version = cache_version(*_TABLES)
+    cached = _cache.get(_CACHE_KEY)
+    if cached is not None and cached[0] == version:
+        stats = cached[1]
+    else:
+        today = datetime.utcnow().date()
+        stats = db.session.execute(headline_counts_statement(today)).one()._asdict()
+        expiring, needing_renewal = membership_alert_statements(current_app.config['DASHBOARD_ALERT_LIMIT'])
+        stats['expiring_members'] = db.session.execute(expiring).all()
+        stats['members_needing_renewal'] = db.session.execute(needing_renewal).all()
+        _cache.set(_CACHE_KEY, (version, stats))
+    return stats
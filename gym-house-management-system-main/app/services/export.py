@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from app import db
+from app.models import Member, MembershipPlan, Trainer, WorkoutPlan, Payment, Attendance
+
+
+def _members_statement():
+    return (
+        db.select(
+            Member.id, Member.name, Member.email, Member.phone, Member.join_date,
+            MembershipPlan.name.label('membership_plan'),
+            Member.membership_start_date, Member.membership_end_date,
+            Trainer.name.label('trainer'),
+            WorkoutPlan.name.label('workout_plan'),
+        )
+        .outerjoin(MembershipPlan, Member.membership_plan_id == MembershipPlan.id)
+        .outerjoin(Trainer, Member.trainer_id == Trainer.id)
+        .outerjoin(WorkoutPlan, Member.workout_plan_id == WorkoutPlan.id)
+    )
+
+
+def _payments_statement():
+    return (
+        db.select(
+            Payment.id, Payment.member_id, Member.name.label('member_name'),
+            Payment.amount, Payment.payment_date, MembershipPlan.name.label('plan'),
+        )
+        .join(Member, Payment.member_id == Member.id)
+        .outerjoin(MembershipPlan, Payment.plan_id == MembershipPlan.id)
+    )
+
+
+def _attendance_statement():
+    return (
+        db.select(
+            Attendance.id, Attendance.member_id, Member.name.label('member_name'),
+            Attendance.check_in_time, Attendance.check_out_time,
+        )
+        .join(Member, Attendance.member_id == Member.id)
+    )
+
+
+# kind -> (statement builder, date column for range filters and ordering,
+#          member id column)
+EXPORTS = {
+    'members': (_members_statement, Member.join_date, Member.id),
+    'payments': (_payments_statement, Payment.payment_date, Payment.member_id),
+    'attendance': (_attendance_statement, Attendance.check_in_time, Attendance.member_id),
+}
+
+
+def export_columns(kind):
+    return [column.key for column in EXPORTS[kind][0]().selected_columns]
+
+
+def export_statement(kind, start=None, end=None, member_id=None):
+    build, date_column, member_column = EXPORTS[kind]
+    statement = build()
+    # `start`/`end` are inclusive dates; DateTime columns get a half-open range
+    if isinstance(date_column.type, db.DateTime):
+        if start:
+            statement = statement.where(date_column >= datetime.combine(start, time.min))
+        if end:
+            statement = statement.where(date_column < datetime.combine(end + timedelta(days=1), time.min))
+    else:
+        if start:
+            statement = statement.where(date_column >= start)
+        if end:
+            statement = statement.where(date_column <= end)
+    if member_id:
+        statement = statement.where(member_column == member_id)
+    # (date, id) order walks the date index instead of sorting the table
+    id_column = date_column.class_.id
+    return statement.order_by(date_column, id_column)
+
+
+def iter_export_chunks(kind, start=None, end=None, member_id=None, chunk_size=1000):
+    """Yield lists of up to `chunk_size` rows.
+
+    Rows are fetched with a server-side cursor where the driver supports one,
+    so only one chunk is held in memory at a time.
+    """
+    statement = export_statement(kind, start, end, member_id).execution_options(
+        stream_results=True, yield_per=chunk_size)
+    yield from db.session.execute(statement).partitions()
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Two-place amounts survive the round trip through float exactly
+        return float(value)
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    return value if isinstance(value, Decimal) else _json_value(value)
+
+
+def iter_csv(kind, **filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns(kind))
+    for rows in iter_export_chunks(kind, **filters):
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(kind, **filters):
+    columns = export_columns(kind)
+    for rows in iter_export_chunks(kind, **filters):
+        yield ''.join(
+            json.dumps({column: _json_value(value) for column, value in zip(columns, row)}) + '\n'
+            for row in rows
+        )
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
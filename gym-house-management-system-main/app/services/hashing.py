@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from flask_bcrypt import Bcrypt
+from app import bcrypt
+
+# Stand-alone instance for pool workers, which have no application context.
+_worker_bcrypt = Bcrypt()
+
+
+def _hash_password(password, rounds):
+    return _worker_bcrypt.generate_password_hash(password, rounds).decode('utf-8')
+
+
+def hash_cost(pw_hash):
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Bounded pools for bcrypt work, so it can't monopolise request threads.
+
+    Bulk account creation hashes on a process pool of `hash_workers`.
+    Login checks run on a thread pool of `verify_workers` (bcrypt releases
+    the GIL), which caps how many CPUs a login spike can occupy.
+    """
+
+    def __init__(self, rounds, hash_workers, verify_workers):
+        self.rounds = rounds
+        self.hash_workers = hash_workers
+        self._hash_pool = None
+        self._verify_pool = ThreadPoolExecutor(max_workers=verify_workers, thread_name_prefix='bcrypt-verify')
+
+    def _get_hash_pool(self):
+        if self._hash_pool is None:
+            self._hash_pool = ProcessPoolExecutor(max_workers=self.hash_workers)
+        return self._hash_pool
+
+    def hash(self, password):
+        return _hash_password(password, self.rounds)
+
+    def hash_many(self, passwords):
+        passwords = list(passwords)
+        if self.hash_workers <= 1 or len(passwords) < 2:
+            return [_hash_password(password, self.rounds) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.hash_workers * 4))
+        return list(self._get_hash_pool().map(_hash_password, passwords,
+                                               [self.rounds] * len(passwords), chunksize=chunksize))
+
+    def verify(self, pw_hash, password):
+        return self._verify_pool.submit(bcrypt.check_password_hash, pw_hash, password).result()
+
+    def needs_rehash(self, pw_hash):
+        return hash_cost(pw_hash) != self.rounds
+
+    def shutdown(self):
+        self._verify_pool.shutdown(wait=False)
+        if self._hash_pool is not None:
+            self._hash_pool.shutdown(wait=False)
+
+
+def get_password_hasher():
+    app = current_app._get_current_object()
+    hasher = app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = PasswordHasher(app.config['BCRYPT_LOG_ROUNDS'],
+                                app.config['PASSWORD_HASH_WORKERS'],
+                                app.config['PASSWORD_VERIFY_WORKERS'])
+        app.extensions['password_hasher'] = hasher
+    return hasher
@@ -0,0 +1,237 @@
+import csv
+import time
+from datetime import date
+from itertools import islice
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.cache import mark_written
+from app.services.hashing import get_password_hasher
+from app.models import Member, MembershipPlan, Payment, User
+from app.services.rollups import add_payments
+from app.services.memberships import membership_status
+from app.services.members import mark_member_history_written
+from app.services import search
+from app.money import from_cents, to_cents
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.errors = []  # (line number, message)
+        self.started_at = time.monotonic()
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def _chunks(reader, size):
+    # (line number, row) pairs; line 1 is the header
+    numbered = enumerate(reader, start=2)
+    while True:
+        chunk = list(islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_date(value, field):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{field} must be YYYY-MM-DD')
+
+
+def _plan_ids():
+    return dict(db.session.execute(db.select(MembershipPlan.name, MembershipPlan.id)).all())
+
+
+def _validate_member_row(row, plans):
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    try:
+        email = validate_email((row.get('email') or '').strip(), check_deliverability=False).normalized
+    except EmailNotValidError as exc:
+        raise ValueError(f'invalid email: {exc}')
+
+    plan_name = (row.get('membership_plan') or '').strip()
+    if plan_name and plan_name not in plans:
+        raise ValueError(f'unknown membership plan {plan_name!r}')
+    start = _parse_date(row.get('membership_start_date'), 'membership_start_date')
+    member = {
+        'name': name,
+        'email': email,
+        'phone': (row.get('phone') or '').strip() or None,
+        'join_date': _parse_date(row.get('join_date'), 'join_date') or start or date.today(),
+        'membership_plan_id': plans.get(plan_name),
+        'membership_start_date': start,
+        'membership_end_date': _parse_date(row.get('membership_end_date'), 'membership_end_date'),
+    }
+    member['membership_status'] = membership_status(member['membership_end_date'])
+
+    username = (row.get('username') or '').strip()
+    password = row.get('password') or ''
+    if username and not password:
+        raise ValueError('password is required when username is given')
+    return member, (username, password) if username else None
+
+
+def _insert_members(members, accounts):
+    # One executemany per table; member ids are read back with a single
+    # lookup by email so users can be linked to them. `accounts` holds
+    # (member, username, password hash) triples.
+    db.session.execute(db.insert(Member), members)
+    ids = dict(db.session.execute(
+        db.select(Member.email, Member.id).where(Member.email.in_([m['email'] for m in members]))
+    ).all())
+    users = [{
+        'username': username,
+        'email': member['email'],
+        'password_hash': password_hash,
+        'role': 'subscription',
+        'member_id': ids[member['email']],
+    } for member, username, password_hash in accounts]
+    if users:
+        db.session.execute(db.insert(User), users)
+    search.reindex(db.session.connection(), 'member', ids.values())
+    mark_written(db.session, 'member', 'user')
+
+
+def import_members(stream, chunk_size=1000):
+    """Import members (and optional user accounts) from a CSV stream.
+
+    Columns: name, email, phone, join_date, membership_plan (plan name),
+    membership_start_date, membership_end_date, username, password.
+    Rows are read and written `chunk_size` at a time. Members whose email, or
+    accounts whose username, already exist are skipped as duplicates; invalid
+    rows are reported and skipped without aborting the load.
+    """
+    report = ImportReport()
+    plans = _plan_ids()
+    hasher = get_password_hasher()
+    seen_emails, seen_usernames = set(), set()
+
+    for chunk in _chunks(csv.DictReader(stream), chunk_size):
+        report.rows += len(chunk)
+        valid = []
+        for line, row in chunk:
+            try:
+                member, account = _validate_member_row(row, plans)
+            except ValueError as exc:
+                report.error(line, str(exc))
+                continue
+            valid.append((line, member, account))
+
+        # One lookup per chunk for emails/usernames already in the database
+        emails = [member['email'] for _, member, _ in valid]
+        usernames = [account[0] for _, _, account in valid if account]
+        existing_emails = set(db.session.execute(
+            db.select(Member.email).where(Member.email.in_(emails))).scalars())
+        existing_emails |= set(db.session.execute(
+            db.select(User.email).where(User.email.in_(emails))).scalars())
+        existing_usernames = set(db.session.execute(
+            db.select(User.username).where(User.username.in_(usernames))).scalars()) if usernames else set()
+
+        rows = []
+        for line, member, account in valid:
+            username = account[0] if account else None
+            if (member['email'] in existing_emails or member['email'] in seen_emails
+                    or username in existing_usernames or username in seen_usernames):
+                report.duplicates += 1
+                continue
+            seen_emails.add(member['email'])
+            if username:
+                seen_usernames.add(username)
+            rows.append((line, member, account))
+        if not rows:
+            continue
+
+        # Hash the chunk's passwords in parallel on the process pool
+        with_accounts = [(member, account) for _, member, account in rows if account]
+        hashes = hasher.hash_many(password for _, (_, password) in with_accounts)
+        accounts = {member['email']: (member, username, password_hash)
+                    for (member, (username, _)), password_hash in zip(with_accounts, hashes)}
+
+        try:
+            _insert_members([member for _, member, _ in rows], list(accounts.values()))
+            db.session.commit()
+            report.inserted += len(rows)
+        except IntegrityError:
+            # Something raced us or slipped past validation; retry this chunk
+            # row by row so only the offending rows are rejected.
+            db.session.rollback()
+            for line, member, _ in rows:
+                try:
+                    account = accounts.get(member['email'])
+                    _insert_members([member], [account] if account else [])
+                    db.session.commit()
+                    report.inserted += 1
+                except IntegrityError as exc:
+                    db.session.rollback()
+                    report.error(line, f'rejected by database: {exc.orig}')
+    return report
+
+
+def import_payments(stream, chunk_size=1000):
+    """Import payment history from a CSV stream.
+
+    Columns: member_email, amount, payment_date, membership_plan (plan name).
+    Payments are attached to existing members by email and inserted as-is;
+    membership dates are not recomputed.
+    """
+    report = ImportReport()
+    plans = _plan_ids()
+
+    for chunk in _chunks(csv.DictReader(stream), chunk_size):
+        report.rows += len(chunk)
+        emails = {(row.get('member_email') or '').strip().lower() for _, row in chunk}
+        member_ids = dict(db.session.execute(
+            db.select(db.func.lower(Member.email), Member.id)
+            .where(db.func.lower(Member.email).in_(emails))
+        ).all())
+
+        payments = []
+        for line, row in chunk:
+            try:
+                member_id = member_ids.get((row.get('member_email') or '').strip().lower())
+                if member_id is None:
+                    raise ValueError(f"no member with email {row.get('member_email')!r}")
+                try:
+                    amount = from_cents(to_cents((row.get('amount') or '').strip()))
+                except ValueError:
+                    raise ValueError('amount must be a number')
+                if amount < 0:
+                    raise ValueError('amount must not be negative')
+                payment_date = _parse_date(row.get('payment_date'), 'payment_date')
+                if payment_date is None:
+                    raise ValueError('payment_date is required')
+                plan_name = (row.get('membership_plan') or '').strip()
+                if plan_name and plan_name not in plans:
+                    raise ValueError(f'unknown membership plan {plan_name!r}')
+            except ValueError as exc:
+                report.error(line, str(exc))
+                continue
+            payments.append({'member_id': member_id, 'amount': amount,
+                              'payment_date': payment_date, 'plan_id': plans.get(plan_name)})
+
+        if payments:
+            db.session.execute(db.insert(Payment), payments)
+            add_payments(db.session, payments)
+            mark_written(db.session, 'payment')
+            mark_member_history_written(db.session, {payment['member_id'] for payment in payments})
+            db.session.commit()
+            report.inserted += len(payments)
+    return report
@@ -0,0 +1,193 @@
+import atexit
+import hashlib
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.cache import TTLCache, mark_written
+from app.models import Inquiry
+from app.ratelimit import check_rate_limit
+from app.services import search
+
+# Public inquiry intake. Submissions are throttled per client address, an
+# inquiry repeating one from the same email within the duplicate window is
+# dropped, and accepted ones are queued in memory and inserted in batches
+# by a writer thread, so a flood of submissions costs the database one
+# transaction per batch instead of one per form post. Queued inquiries not
+# yet written are lost if the process dies without a clean shutdown; a
+# normal exit flushes them.
+
+ACCEPTED, DUPLICATE, RATE_LIMITED, BUSY = 'accepted', 'duplicate', 'rate_limited', 'busy'
+
+_recent = TTLCache(ttl=24 * 3600, maxsize=10000)
+
+
+def content_hash(email, message):
+    """Hash of the normalized email and message, for duplicate detection."""
+    text = re.sub(r'\s+', ' ', (message or '').strip().lower())
+    return hashlib.sha256(f'{email.strip().lower()}\0{text}'.encode()).hexdigest()
+
+
+def write_inquiries(session, rows):
+    """Insert `rows` (Inquiry column dicts with content_hash), skipping
+    duplicates of each other and of inquiries already stored within the
+    duplicate window, index them for search and commit. Returns the number
+    inserted."""
+    window = timedelta(hours=current_app.config['INQUIRY_DUPLICATE_WINDOW_HOURS'])
+    since = min(row['submitted_at'] for row in rows) - window
+    seen = set(session.execute(
+        db.select(Inquiry.content_hash)
+        .where(Inquiry.content_hash.in_({row['content_hash'] for row in rows}), Inquiry.submitted_at >= since)
+    ).scalars())
+    fresh = []
+    for row in rows:
+        if row['content_hash'] not in seen:
+            seen.add(row['content_hash'])
+            fresh.append(row)
+    if fresh:
+        ids = session.execute(db.insert(Inquiry).returning(Inquiry.id), fresh).scalars().all()
+        # Bulk inserts bypass the flush hook that keeps the search index current
+        search.reindex(session.connection(), 'inquiry', ids)
+        mark_written(session, 'inquiry')
+    session.commit()
+    return len(fresh)
+
+
+class InquiryBuffer:
+    """Holds accepted inquiries in memory and writes them in batches.
+
+    A writer thread waits for the first queued inquiry, collects more for up
+    to `interval` seconds or `batch_size` rows and writes them with
+    write_inquiries(). A batch that fails with an OperationalError (database
+    locked or unavailable) is retried up to `retries` times, waiting
+    `interval` seconds longer each time, and then logged and dropped, so a
+    permanent error (e.g. a missing migration) can't stall the queue. One
+    that fails otherwise is written row by row and the failing rows are
+    logged and dropped. At most `max_pending` inquiries are held; submit()
+    refuses more.
+    """
+
+    def __init__(self, app, batch_size=100, interval=2.0, max_pending=10000, retries=5):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='inquiry-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            return False
+        return True
+
+    def _collect(self):
+        rows = [self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows):
+        with self.app.app_context():
+            try:
+                write_inquiries(db.session, rows)
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+    def _write_batch(self, rows):
+        for attempt in range(1, self.retries + 2):
+            try:
+                self._write(rows)
+                return
+            except OperationalError:
+                if attempt > self.retries:
+                    self.app.logger.exception('Dropping %d inquiries that could not be written: %r',
+                                              len(rows), rows)
+                    return
+                # Database unavailable or locked: keep the rows and try again
+                self.app.logger.exception('Failed to write %d inquiries; retrying', len(rows))
+                time.sleep(self.interval * attempt)
+            except Exception:
+                if len(rows) == 1:
+                    self.app.logger.exception('Dropping inquiry that could not be written: %r', rows[0])
+                    return
+                # Find the bad row without losing the rest
+                for row in rows:
+                    self._write_batch([row])
+                return
+
+    def _run(self):
+        while True:
+            rows = self._collect()
+            self._write_batch(rows)
+            for _ in rows:
+                self._queue.task_done()
+
+    def flush(self, timeout=10):
+        """Wait up to `timeout` seconds for queued inquiries to be written;
+        returns True if none are left."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+
+def get_inquiry_buffer():
+    app = current_app._get_current_object()
+    buffer = app.extensions.get('inquiry_buffer')
+    if buffer is None:
+        buffer = InquiryBuffer(app,
+                               batch_size=app.config['INQUIRY_BATCH_SIZE'],
+                               interval=app.config['INQUIRY_FLUSH_SECONDS'],
+                               max_pending=app.config['INQUIRY_BUFFER_MAX'],
+                               retries=app.config['INQUIRY_WRITE_RETRIES'])
+        app.extensions['inquiry_buffer'] = buffer
+        atexit.register(buffer.flush)
+    return buffer
+
+
+def submit_inquiry(name, email, phone, message, client):
+    """Take a submission from the public form; returns (status, retry_after)
+    where status is ACCEPTED, DUPLICATE, RATE_LIMITED or BUSY and
+    retry_after is the seconds to wait when RATE_LIMITED."""
+    config = current_app.config
+    allowed, retry_after = check_rate_limit('inquiry', client, config['INQUIRY_RATE_PER_HOUR'],
+                                            config['INQUIRY_RATE_BURST'])
+    if not allowed:
+        return RATE_LIMITED, retry_after
+
+    # Repeats are caught here within this process, and by write_inquiries()
+    # against the database
+    digest = content_hash(email, message)
+    _recent.ttl = config['INQUIRY_DUPLICATE_WINDOW_HOURS'] * 3600
+    if _recent.get(digest):
+        return DUPLICATE, 0
+    row = {'name': name, 'email': email, 'phone': phone, 'message': message,
+           'submitted_at': datetime.utcnow(), 'content_hash': digest}
+    if not get_inquiry_buffer().submit(row):
+        return BUSY, 0
+    _recent.set(digest, True)
+    return ACCEPTED, 0
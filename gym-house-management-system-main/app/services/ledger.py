@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.cache import mark_written
+from app.models import Member, MembershipPlan, Payment
+from app.services.memberships import membership_status
+from app.services.notifications import queue_payment_receipt
+
+# Payments that buy a plan extend the member's membership. The payment, the
+# extension and the receipt are written in one transaction, and the
+# extension is a conditional UPDATE that only applies if the membership
+# dates are still the ones it was computed from. Two payments for the same
+# member at once (front desk and online) therefore never lose an extension:
+# the loser's UPDATE matches no row, or the database refuses its write
+# (PostgreSQL row lock timeout, SQLite busy snapshot), and the whole
+# transaction is retried against the new dates.
+
+
+class MembershipConflict(Exception):
+    """The membership changed under us, or the database refused the write."""
+
+
+def extended_dates(start_date, end_date, payment_date, days):
+    """(start, end) after a payment on `payment_date` buying `days` of
+    membership: an unexpired membership is extended from its end date, a
+    lapsed or missing one starts again on the payment date."""
+    if start_date and end_date and end_date >= payment_date:
+        return start_date, end_date + timedelta(days=days)
+    return payment_date, payment_date + timedelta(days=days)
+
+
+def extend_membership(session, member_id, payment_date, days):
+    """Extend `member_id`'s membership in the session's transaction; returns
+    the new (start, end). Raises MembershipConflict if the dates changed
+    between reading and writing them."""
+    start_date, end_date = session.execute(
+        db.select(Member.membership_start_date, Member.membership_end_date)
+        .where(Member.id == member_id)
+        .with_for_update()
+    ).one()
+    new_start, new_end = extended_dates(start_date, end_date, payment_date, days)
+    updated = session.execute(
+        db.update(Member)
+        .where(Member.id == member_id,
+               Member.membership_start_date.is_not_distinct_from(start_date),
+               Member.membership_end_date.is_not_distinct_from(end_date))
+        .values(membership_start_date=new_start, membership_end_date=new_end,
+                membership_status=membership_status(new_end))
+    ).rowcount
+    if updated != 1:
+        raise MembershipConflict(f'membership of member {member_id} changed concurrently')
+    mark_written(session, 'member')
+    return new_start, new_end
+
+
+def _retry_delay(attempt):
+    # Short exponential backoff with jitter, so the payments that collided
+    # don't collide again
+    return 0.01 * 2 ** attempt * random.uniform(1, 1.5)
+
+
+def record_payment(member_id, amount, payment_date, plan_id=None, retries=None):
+    """Record a payment, extend the membership if it is for a plan, queue
+    the receipt and commit, retrying the transaction on contention.
+
+    Returns the Payment. Raises MembershipConflict if it still could not be
+    written after `retries` (MEMBERSHIP_UPDATE_RETRIES) attempts; nothing is
+    recorded in that case.
+    """
+    retries = retries if retries is not None else current_app.config['MEMBERSHIP_UPDATE_RETRIES']
+    for attempt in range(retries):
+        try:
+            payment = Payment(member_id=member_id, amount=amount, payment_date=payment_date, plan_id=plan_id)
+            db.session.add(payment)
+            # Insert first: on SQLite that takes the write lock, so the
+            # membership is read and updated with no other writer between
+            db.session.flush()
+            plan = db.session.get(MembershipPlan, plan_id) if plan_id else None
+            if plan is not None:
+                extend_membership(db.session, member_id, payment_date, plan.duration_days)
+            queue_payment_receipt(db.session, payment, db.session.get(Member, member_id), plan)
+            db.session.commit()
+            return payment
+        except (MembershipConflict, OperationalError) as exc:
+            db.session.rollback()
+            if attempt + 1 >= retries:
+                raise MembershipConflict(f'payment for member {member_id} not recorded: {exc}') from exc
+            current_app.logger.info('Retrying payment for member %s after conflict: %s', member_id, exc)
+            time.sleep(_retry_delay(attempt))
@@ -0,0 +1,119 @@
+from itertools import chain
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from app import db
+from app.cache import TTLCache
+from app.database import read_from_replica, replica_version
+from app.models import Attendance, Member, Payment
+from app.pagination import paginate_keyset
+
+
+def _prefix_upper_bound(prefix):
+    # Smallest string greater than every string starting with `prefix`
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def member_search_statement(term, limit):
+    # Half-open ranges on lower(name)/lower(email) rather than LIKE, so the
+    # expression indexes on those columns are used on every backend.
+    upper = _prefix_upper_bound(term)
+    name = db.func.lower(Member.name)
+    email = db.func.lower(Member.email)
+    return (
+        db.select(Member.id, Member.name, Member.email)
+        .where(db.or_(
+            db.and_(name >= term, name < upper),
+            db.and_(email >= term, email < upper)
+        ))
+        .order_by(Member.name, Member.id)
+        .limit(limit)
+    )
+
+
+def search_members(term, limit=20):
+    """Members whose name or email starts with `term` (case-insensitive)."""
+    term = term.strip().lower()
+    if not term:
+        return []
+    return db.session.execute(member_search_statement(term, limit)).all()
+
+
+# --- Profile ---
+# The profile shows aggregates over a member's whole history plus the most
+# recent payments and visits, with older ones fetched a page at a time. The
+# rendered summary is cached per member and dropped when that member's
+# payments or attendance are written in this process; the TTL bounds
+# staleness from writes made by other worker processes. Summaries read from
+# a replica are cached apart, under the replica's version.
+
+_summary_cache = TTLCache(ttl=300, maxsize=1000)
+
+
+def member_summary_statement(member_id):
+    # Each aggregate is a scalar subquery over the (member_id, date) index,
+    # so the whole summary is one round trip.
+    def scalar(*columns, model):
+        return db.select(*columns).select_from(model).where(model.member_id == member_id).scalar_subquery()
+
+    return db.select(
+        scalar(db.func.count(), model=Attendance).label('visits'),
+        scalar(db.func.max(Attendance.check_in_time), model=Attendance).label('last_visit'),
+        scalar(db.func.count(), model=Payment).label('payments'),
+        scalar(db.func.coalesce(db.func.sum(Payment.amount), 0), model=Payment).label('lifetime_spend'),
+    )
+
+
+def member_summary(member_id):
+    return db.session.execute(member_summary_statement(member_id)).one()
+
+
+def get_member_summary_html(member_id):
+    """The rendered members/_summary.html fragment for `member_id`, cached."""
+    _summary_cache.ttl = current_app.config['MEMBER_SUMMARY_CACHE_TTL']
+    key = (member_id, replica_version()) if read_from_replica() else member_id
+    html = _summary_cache.get(key)
+    if html is None:
+        html = Markup(render_template('members/_summary.html', summary=member_summary(member_id)))
+        _summary_cache.set(key, html)
+    return html
+
+
+def mark_member_history_written(session, member_ids):
+    # For bulk payment/attendance inserts that bypass the unit of work
+    session.info.setdefault('written_member_history', set()).update(member_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_member_history_writes(session, flush_context):
+    member_ids = {obj.member_id for obj in chain(session.new, session.dirty, session.deleted)
+                  if isinstance(obj, (Payment, Attendance))}
+    if member_ids:
+        mark_member_history_written(session, member_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_member_summaries(session):
+    for member_id in session.info.pop('written_member_history', ()):
+        _summary_cache.pop(member_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_member_history_writes(session):
+    session.info.pop('written_member_history', None)
+
+
+MEMBER_HISTORY = {
+    'payments': (lambda member_id: Payment.query.options(joinedload(Payment.plan))
+                 .filter(Payment.member_id == member_id), Payment.payment_date, Payment.id),
+    'attendance': (lambda member_id: Attendance.query.filter(Attendance.member_id == member_id),
+                   Attendance.check_in_time, Attendance.id),
+}
+
+
+def member_history_page(member_id, kind, cursor=None):
+    """One page of a member's payments or visits, newest first."""
+    query, sort_column, id_column = MEMBER_HISTORY[kind]
+    return paginate_keyset(query(member_id), sort_column, id_column, cursor,
+                           per_page=current_app.config['MEMBER_HISTORY_PAGE_SIZE'])
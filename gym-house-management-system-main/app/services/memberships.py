@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from app import db
+from app.cache import mark_written
+from app.models import Member, RenewalNotice
+
+# Member.membership_status is derived from membership_end_date and today's
+# date. It is set whenever a member row is written (mapper hooks below, or by
+# the caller for bulk inserts) and moved along as days pass by
+# refresh_statuses(), which `flask refresh-memberships` runs from cron. List
+# views and the dashboard filter on the indexed column instead of comparing
+# dates row by row.
+
+ACTIVE, EXPIRING, EXPIRED, NO_MEMBERSHIP = 'active', 'expiring', 'expired', 'none'
+MEMBERSHIP_STATUSES = (ACTIVE, EXPIRING, EXPIRED, NO_MEMBERSHIP)
+DEFAULT_EXPIRING_DAYS = 7
+
+
+def _expiring_days():
+    return current_app.config['MEMBERSHIP_EXPIRING_DAYS'] if has_app_context() else DEFAULT_EXPIRING_DAYS
+
+
+def membership_status(end_date, today=None, expiring_days=None):
+    if end_date is None:
+        return NO_MEMBERSHIP
+    today = today or datetime.utcnow().date()
+    if end_date < today:
+        return EXPIRED
+    if end_date <= today + timedelta(days=expiring_days if expiring_days is not None else _expiring_days()):
+        return EXPIRING
+    return ACTIVE
+
+
+def membership_status_expression(today, expiring_days):
+    """membership_status() as a SQL CASE over Member.membership_end_date."""
+    return db.case(
+        (Member.membership_end_date.is_(None), NO_MEMBERSHIP),
+        (Member.membership_end_date < today, EXPIRED),
+        (Member.membership_end_date <= today + timedelta(days=expiring_days), EXPIRING),
+        else_=ACTIVE,
+    )
+
+
+@event.listens_for(Member, 'before_insert')
+@event.listens_for(Member, 'before_update')
+def _set_membership_status(mapper, connection, member):
+    member.membership_status = membership_status(member.membership_end_date)
+
+
+def _id_ranges(chunk_size):
+    low, high = db.session.execute(db.select(db.func.min(Member.id), db.func.max(Member.id))).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield start, start + chunk_size
+
+
+def refresh_statuses(today=None, chunk_size=1000):
+    """Bring every member's status up to date and record renewal notices.
+
+    Works through members in id ranges of `chunk_size`, committing each, so
+    it never holds a long write lock. Safe to re-run: only rows whose status
+    is stale are updated, and a notice is recorded once per member, end date
+    and kind. 'expired' notices are only recorded for memberships that ended
+    within RENEWAL_NOTICE_GRACE_DAYS. Returns (statuses changed, notices added).
+    """
+    today = today or datetime.utcnow().date()
+    status = membership_status_expression(today, current_app.config['MEMBERSHIP_EXPIRING_DAYS'])
+    grace_start = today - timedelta(days=current_app.config['RENEWAL_NOTICE_GRACE_DAYS'])
+    changed = added = 0
+
+    for start, end in _id_ranges(chunk_size):
+        in_chunk = Member.id.between(start, end - 1)
+        updated = db.session.execute(
+            db.update(Member)
+            .where(in_chunk, Member.membership_status != status)
+            .values(membership_status=status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            mark_written(db.session, 'member')
+        changed += updated
+
+        already_sent = db.select(RenewalNotice.id).where(
+            RenewalNotice.member_id == Member.id,
+            RenewalNotice.membership_end_date == Member.membership_end_date,
+            RenewalNotice.kind == Member.membership_status,
+        ).exists()
+        notices = db.session.execute(
+            db.insert(RenewalNotice).from_select(
+                ['member_id', 'membership_end_date', 'kind', 'created_at'],
+                db.select(Member.id, Member.membership_end_date, Member.membership_status,
+                          db.literal(datetime.utcnow(), db.DateTime))
+                .where(in_chunk, ~already_sent, db.or_(
+                    Member.membership_status == EXPIRING,
+                    db.and_(Member.membership_status == EXPIRED, Member.membership_end_date >= grace_start),
+                ))
+            )
+        ).rowcount
+        if notices:
+            mark_written(db.session, 'renewal_notice')
+        added += notices
+        db.session.commit()
+    return changed, added
@@ -0,0 +1,315 @@
+import json
+import random
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from itertools import islice
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.cache import mark_written
+from app.models import Member, Notification, RenewalNotice
+from app.services.memberships import EXPIRING
+
+# Messages to members go through the notification table (an outbox): request
+# handlers and jobs only insert rows, in the same transaction as the change
+# they report, and `flask deliver-notifications` sends them in batches.
+# Delivery is at least once; a crash between sending and recording the
+# result means that batch is sent again once its claim times out.
+
+PENDING, SENT, FAILED = 'pending', 'sent', 'failed'
+
+# A claimed batch not recorded as sent or failed within this long is picked
+# up again by the next delivery run.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+_INSERT_IGNORE_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+# --- Transports ---
+
+class FileTransport:
+    """Appends each message as a JSON line to `path` instead of sending it."""
+
+    def __init__(self, path, sender):
+        self.path = path
+        self.sender = sender
+        self._lock = threading.Lock()
+
+    def send(self, recipient, subject, body):
+        line = json.dumps({'from': self.sender, 'to': recipient, 'subject': subject, 'body': body,
+                           'sent_at': datetime.utcnow().isoformat()})
+        with self._lock, open(self.path, 'a', encoding='utf-8') as sink:
+            sink.write(line + '\n')
+
+    def close(self):
+        pass
+
+
+class SMTPTransport:
+    """Sends through an SMTP server, keeping one connection per sending thread.
+
+    For local testing point it at a throwaway server, e.g.
+    `python -m aiosmtpd -n -l localhost:1025` with SMTP_PORT=1025.
+    """
+
+    def __init__(self, host, port, sender, username=None, password=None, use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def _drop(self, connection):
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        try:
+            connection.close()
+        except smtplib.SMTPException:
+            pass
+
+    def send(self, recipient, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = recipient
+        message['Subject'] = subject
+        message.set_content(body)
+
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        try:
+            connection.send_message(message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Reconnect on the next message; this one is retried later
+            self._local.connection = None
+            self._drop(connection)
+            raise
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+def _file_transport(config):
+    return FileTransport(config['NOTIFICATION_FILE'], config['NOTIFICATION_SENDER'])
+
+
+def _smtp_transport(config):
+    return SMTPTransport(config['SMTP_HOST'], config['SMTP_PORT'], config['NOTIFICATION_SENDER'],
+                         username=config['SMTP_USERNAME'], password=config['SMTP_PASSWORD'],
+                         use_tls=config['SMTP_USE_TLS'], timeout=config['SMTP_TIMEOUT'])
+
+
+TRANSPORTS = {'file': _file_transport, 'smtp': _smtp_transport}
+
+
+class Notifier:
+    """Sends messages through `transport`, at most `concurrency` at a time."""
+
+    def __init__(self, transport, concurrency):
+        self.transport = transport
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='notify')
+
+    def _send(self, message):
+        try:
+            self.transport.send(message.recipient, message.subject, message.body)
+        except Exception as exc:
+            return f'{type(exc).__name__}: {exc}'[:255]
+        return None
+
+    def send_all(self, messages):
+        """Send `messages`; returns an error string or None for each."""
+        return list(self._pool.map(self._send, messages))
+
+    def shutdown(self):
+        self._pool.shutdown()
+        self.transport.close()
+
+
+def get_notifier():
+    app = current_app._get_current_object()
+    notifier = app.extensions.get('notifier')
+    if notifier is None:
+        transport = TRANSPORTS[app.config['NOTIFICATION_TRANSPORT']](app.config)
+        notifier = Notifier(transport, app.config['NOTIFICATION_CONCURRENCY'])
+        app.extensions['notifier'] = notifier
+    return notifier
+
+
+# --- Queueing ---
+
+def enqueue(session, messages):
+    """Add messages (dicts with kind, dedupe_key, recipient, subject and body)
+    to the outbox in the session's transaction. Messages whose dedupe_key is
+    already queued or sent are skipped. Returns the number added."""
+    messages = list(messages)
+    if not messages:
+        return 0
+    connection = session.connection()
+    insert = _INSERT_IGNORE_DIALECTS.get(connection.dialect.name)
+    if insert is not None:
+        added = connection.execute(
+            insert(Notification.__table__).on_conflict_do_nothing(index_elements=['dedupe_key']), messages
+        ).rowcount
+    else:
+        keys = [message['dedupe_key'] for message in messages]
+        queued = set(connection.execute(
+            db.select(Notification.dedupe_key).where(Notification.dedupe_key.in_(keys))
+        ).scalars())
+        messages = [message for message in messages if message['dedupe_key'] not in queued]
+        if messages:
+            connection.execute(db.insert(Notification), messages)
+        added = len(messages)
+    if added:
+        mark_written(session, 'notification')
+    return added
+
+
+def _renewal_message(notice_id, kind, end_date, name, email):
+    if kind == EXPIRING:
+        subject = f'Your Gym House membership ends on {end_date:%d %B %Y}'
+        body = (f'Hi {name},\n\nYour membership ends on {end_date:%d %B %Y}. Renew at the front '
+                f'desk before then to keep training without a break.\n\nGym House')
+    else:
+        subject = 'Your Gym House membership has ended'
+        body = (f'Hi {name},\n\nYour membership ended on {end_date:%d %B %Y}. We would love to '
+                f'see you back; renew at the front desk any time.\n\nGym House')
+    return {'kind': 'renewal_reminder', 'dedupe_key': f'renewal:{notice_id}', 'recipient': email,
+            'subject': subject, 'body': body}
+
+
+def queue_renewal_reminders(since=None, chunk_size=500):
+    """Queue a reminder for each renewal notice recorded since `since`.
+
+    The notices are written by refresh_statuses(), so the 'expiring' ones
+    are the dashboard's expiring-members cohort. Members who renewed in the
+    meantime (whose status or end date no longer matches the notice) are
+    skipped. Returns the number of reminders queued.
+    """
+    since = since or datetime.utcnow() - timedelta(days=current_app.config['MEMBERSHIP_EXPIRING_DAYS'])
+    rows = iter(db.session.execute(
+        db.select(RenewalNotice.id, RenewalNotice.kind, RenewalNotice.membership_end_date,
+                  Member.name, Member.email)
+        .join(Member, Member.id == RenewalNotice.member_id)
+        .where(RenewalNotice.created_at >= since,
+               Member.membership_status == RenewalNotice.kind,
+               Member.membership_end_date == RenewalNotice.membership_end_date)
+        .order_by(RenewalNotice.id)
+    ).all())
+    queued = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        queued += enqueue(db.session, (_renewal_message(*row) for row in chunk))
+        db.session.commit()
+    return queued
+
+
+def queue_payment_receipt(session, payment, member, plan=None):
+    """Queue a receipt for `payment`, which must have been flushed."""
+    lines = [f'Hi {member.name},', '',
+             f'We received your payment of ${payment.amount:.2f} on {payment.payment_date:%d %B %Y}.']
+    if plan is not None:
+        lines.append(f'Plan: {plan.name}')
+    if member.membership_end_date:
+        lines.append(f'Your membership now runs until {member.membership_end_date:%d %B %Y}.')
+    lines += ['', 'Thank you,', 'Gym House']
+    return enqueue(session, [{'kind': 'payment_receipt', 'dedupe_key': f'receipt:{payment.id}',
+                              'recipient': member.email, 'subject': 'Your Gym House payment receipt',
+                              'body': '\n'.join(lines)}])
+
+
+# --- Delivery ---
+
+def _claim(batch_size, now):
+    # One UPDATE ... RETURNING, so two workers never claim the same rows.
+    # On PostgreSQL the inner SELECT skips rows another worker has locked.
+    due = (
+        db.select(Notification.id)
+        .where(Notification.status == PENDING, Notification.next_attempt_at <= now)
+        .order_by(Notification.next_attempt_at, Notification.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.session.execute(
+        db.update(Notification)
+        .where(Notification.id.in_(due), Notification.status == PENDING, Notification.next_attempt_at <= now)
+        .values(next_attempt_at=now + CLAIM_TIMEOUT)
+        .returning(Notification.id, Notification.recipient, Notification.subject, Notification.body,
+                   Notification.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return claimed
+
+
+def _retry_delay(attempts, base_seconds):
+    # Exponential backoff with jitter, so messages that failed together
+    # (e.g. while the mail server was down) don't all retry at once
+    return timedelta(seconds=base_seconds * 2 ** (attempts - 1) * random.uniform(1, 1.2))
+
+
+def deliver_pending(batch_size=None):
+    """Send one batch of due messages; returns (sent, failed).
+
+    Failed messages are retried after an exponentially growing delay, and
+    marked failed for good after NOTIFICATION_MAX_ATTEMPTS.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    messages = _claim(batch_size or config['NOTIFICATION_BATCH_SIZE'], now)
+    if not messages:
+        return 0, 0
+
+    errors = get_notifier().send_all(messages)
+
+    now = datetime.utcnow()
+    updates = []
+    for message, error in zip(messages, errors):
+        attempts = message.attempts + 1
+        if error is None:
+            status = SENT
+        else:
+            status = FAILED if attempts >= config['NOTIFICATION_MAX_ATTEMPTS'] else PENDING
+        updates.append({
+            'id': message.id,
+            'status': status,
+            'attempts': attempts,
+            'next_attempt_at': now if error is None else now + _retry_delay(attempts, config['NOTIFICATION_RETRY_SECONDS']),
+            'last_error': error,
+            'sent_at': now if error is None else None,
+        })
+    db.session.execute(db.update(Notification), updates)
+    mark_written(db.session, 'notification')
+    db.session.commit()
+
+    failed = sum(1 for error in errors if error is not None)
+    if failed:
+        current_app.logger.warning('%d of %d notifications failed; first error: %s', failed, len(messages),
+                                   next(error for error in errors if error is not None))
+    return len(messages) - failed, failed
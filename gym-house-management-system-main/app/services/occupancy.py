@@ -0,0 +1,161 @@
+from datetime import datetime, time, timedelta
+from itertools import chain
+import numpy as np
+from flask import current_app
+from app import db
+from app.cache import TTLCache
+from app.database import cache_version
+from app.models import Attendance
+
+# Occupancy analytics over check-in intervals. Visits are loaded as two
+# int64 arrays of epoch seconds (check-in, check-out) and everything else is
+# array arithmetic: the occupancy curve is a sweep line (sort the +1/-1
+# events, cumulative sum), sampled onto a regular grid with searchsorted.
+#
+# Timestamps are naive, so epoch seconds here are "as if UTC"; weekdays and
+# hours therefore match what is stored.
+
+_cache = TTLCache(ttl=300, maxsize=32)
+_EPOCH = datetime(1970, 1, 1)
+
+# Visits that started this long before the requested range are not loaded
+MAX_VISIT_SECONDS = 24 * 3600
+# Ranges up to this long are read through the check-in time index
+INDEX_RANGE_MAX_SECONDS = 31 * 24 * 3600
+
+
+def _epoch_seconds(column, dialect):
+    if dialect == 'sqlite':
+        # julianday() arithmetic is about twice as fast as strftime('%s')
+        return db.cast(db.func.round((db.func.julianday(column) - 2440587.5) * 86400), db.BigInteger)
+    return db.cast(db.extract('epoch', column), db.BigInteger)
+
+
+def _to_epoch(value):
+    return int((value - _EPOCH).total_seconds())
+
+
+def _from_epoch(seconds):
+    return _EPOCH + timedelta(seconds=int(seconds))
+
+
+def load_intervals(start, end, default_visit, now):
+    """(check_in, check_out) epoch-second arrays for visits overlapping [start, end).
+
+    Visits without a check-out are assumed to last `default_visit` seconds,
+    or until `now` if that is sooner (i.e. the member is probably still in).
+    Returns the two arrays and a boolean array marking those open visits.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    check_in_time = Attendance.check_in_time
+    if dialect == 'sqlite' and end - start > INDEX_RANGE_MAX_SECONDS:
+        # A long range covers most of the table, and SQLite would still seek
+        # the check-in index and then fetch every row out of order. Unary +
+        # hides the index so it does one sequential scan instead.
+        check_in_time = db.literal_column('+attendance.check_in_time', db.DateTime)
+    statement = (
+        db.select(_epoch_seconds(Attendance.check_in_time, dialect),
+                  db.func.coalesce(_epoch_seconds(Attendance.check_out_time, dialect), -1))
+        .where(check_in_time >= _from_epoch(start - MAX_VISIT_SECONDS),
+               check_in_time < _from_epoch(end))
+    )
+    # Core rather than Session.execute: skips the ORM result layer
+    rows = connection.execute(statement).all()
+    # Flatten the row tuples straight into one int64 array; no per-row objects
+    intervals = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+    starts, ends = intervals[:, 0], intervals[:, 1]
+
+    open_visits = ends < 0
+    ends[open_visits] = np.minimum(starts[open_visits] + default_visit, now)
+    ends = np.maximum(ends, starts)
+    keep = ends > start
+    return starts[keep], ends[keep], open_visits[keep]
+
+
+def occupancy_curve(starts, ends):
+    """Event times and the number of people present from each time onwards."""
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([np.ones_like(starts), -np.ones_like(ends)])
+    # At equal timestamps process departures first, so back-to-back visits
+    # don't count as two people.
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+
+def sample_curve(times, counts, grid):
+    """Occupancy at each grid timestamp."""
+    if not len(times):
+        return np.zeros(len(grid), dtype=np.int64)
+    index = np.searchsorted(times, grid, side='right') - 1
+    return np.where(index >= 0, counts[np.maximum(index, 0)], 0)
+
+
+def weekday_hour(seconds):
+    # 1970-01-01 was a Thursday (weekday 3)
+    return (seconds // 86400 + 3) % 7, (seconds // 3600) % 24
+
+
+def compute_occupancy(start_day, end_day, step_minutes, default_visit_minutes, now=None):
+    """Occupancy curve, weekday x hour heatmaps and visit durations for the
+    days `start_day`..`end_day` (inclusive)."""
+    now = _to_epoch(now or datetime.utcnow())
+    start = _to_epoch(datetime.combine(start_day, time.min))
+    end = _to_epoch(datetime.combine(end_day + timedelta(days=1), time.min))
+    step = step_minutes * 60
+
+    starts, ends, open_visits = load_intervals(start, end, default_visit_minutes * 60, now)
+    times, counts = occupancy_curve(starts, ends)
+    grid = np.arange(start, end, step, dtype=np.int64)
+    occupancy = sample_curve(times, counts, grid)
+
+    in_range = (times >= start) & (times < end)
+    if in_range.any():
+        peak_index = np.flatnonzero(in_range)[np.argmax(counts[in_range])]
+        peak = {'occupancy': int(counts[peak_index]), 'at': _from_epoch(times[peak_index]).isoformat()}
+    else:
+        peak = {'occupancy': 0, 'at': None}
+
+    # Check-ins per weekday/hour, and mean occupancy of the grid samples
+    # falling in each weekday/hour cell.
+    checked_in = starts[(starts >= start) & (starts < end)]
+    weekday, hour = weekday_hour(checked_in)
+    check_ins = np.bincount(weekday * 24 + hour, minlength=7 * 24)
+    weekday, hour = weekday_hour(grid)
+    cells = weekday * 24 + hour
+    sample_totals = np.bincount(cells, weights=occupancy, minlength=7 * 24)
+    sample_counts = np.bincount(cells, minlength=7 * 24)
+    average_occupancy = np.divide(sample_totals, sample_counts, out=np.zeros(7 * 24), where=sample_counts > 0)
+
+    # Only real check-outs count towards the average visit length
+    durations = (ends - starts)[~open_visits]
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'visits': int(len(checked_in)),
+        'open_visits': int(np.count_nonzero(open_visits)),
+        'average_visit_minutes': round(float(durations.mean()) / 60, 1) if len(durations) else None,
+        'peak': peak,
+        'step_minutes': step_minutes,
+        'curve': [[_from_epoch(t).isoformat(), int(n)] for t, n in zip(grid, occupancy)],
+        'heatmap': {
+            'weekdays': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+            'check_ins': check_ins.reshape(7, 24).tolist(),
+            'average_occupancy': np.round(average_occupancy, 2).reshape(7, 24).tolist(),
+        },
+    }
+
+
+def get_occupancy(start_day, end_day, step_minutes):
+    """compute_occupancy() cached until attendance is written or
+    OCCUPANCY_CACHE_TTL passes."""
+    _cache.ttl = current_app.config['OCCUPANCY_CACHE_TTL']
+    key = (start_day, end_day, step_minutes)
+    version = cache_version('attendance')
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    result = compute_occupancy(start_day, end_day, step_minutes,
+                               current_app.config['OCCUPANCY_DEFAULT_VISIT_MINUTES'])
+    _cache.set(key, (version, result))
+    return result
@@ -0,0 +1,215 @@
+from datetime import date, timedelta
+from itertools import chain
+import numpy as np
+from flask import current_app
+from app import db
+from app.cache import TTLCache
+from app.database import cache_version
+from app.models import MembershipPlan, Payment
+from app.money import from_cents, raw_cents
+from app.services.rollups import NO_PLAN
+
+# Revenue reporting over payments loaded as columnar int64 arrays (epoch
+# day, member id, plan id, cents, plan duration) in one query. Money stays
+# in integer cents throughout; sums go through bincount's float64 weights,
+# which are exact for totals below 2**53 cents.
+#
+# A payment for a plan buys `duration_days` of membership from its payment
+# date. That coverage drives the subscription figures:
+#   - MRR at the end of a month is the monthly-normalised value (price per
+#     30.4375 days) of all payments whose coverage includes that day.
+#   - A member is active on a day if any of their payments covers it, and
+#     churned in a month if active on its first day but not on the next
+#     month's first day.
+#   - Lifetime value is average revenue per active member-month divided by
+#     the average monthly churn rate.
+
+_cache = TTLCache(ttl=300, maxsize=32)
+_EPOCH = date(1970, 1, 1)
+DAYS_PER_MONTH = 30.4375
+# Ranges up to this long are read through the payment date index
+INDEX_RANGE_MAX_DAYS = 31
+
+
+def _epoch_days(column, dialect):
+    if dialect == 'sqlite':
+        return db.cast(db.func.julianday(column) - 2440587.5, db.Integer)
+    return db.cast(db.extract('epoch', column) / 86400, db.Integer)
+
+
+def _to_epoch_day(value):
+    return (value - _EPOCH).days
+
+
+def _month_start(days):
+    return days.astype('datetime64[D]').astype('datetime64[M]')
+
+
+def load_payments(start, end, plan_durations):
+    """Payments dated `start`..`end` (inclusive) as a dict of int64 arrays:
+    day (epoch days), member, plan (NO_PLAN if none), cents and duration
+    (looked up in `plan_durations`, {plan id: days}; 0 if no plan)."""
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    payment_date = Payment.payment_date
+    if dialect == 'sqlite' and (end - start).days > INDEX_RANGE_MAX_DAYS:
+        # As in occupancy.load_intervals: a long range is most of the table,
+        # and one sequential scan beats walking the date index.
+        payment_date = db.literal_column('+payment.payment_date', db.Date)
+    statement = (
+        db.select(_epoch_days(Payment.payment_date, dialect), Payment.member_id,
+                  db.func.coalesce(Payment.plan_id, NO_PLAN), raw_cents(Payment.amount))
+        .where(payment_date >= start, payment_date <= end)
+    )
+    rows = connection.execute(statement).all()
+    values = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=4 * len(rows)).reshape(-1, 4)
+    payments = dict(zip(('day', 'member', 'plan', 'cents'), values.T))
+
+    # Durations by plan id, without joining the plan table per row. Payments
+    # for no plan or for a plan that has since been deleted get 0.
+    plan_ids = np.array([NO_PLAN] + sorted(plan_durations), dtype=np.int64)
+    durations = np.array([0] + [plan_durations[plan_id] for plan_id in plan_ids[1:]], dtype=np.int64)
+    index = np.minimum(np.searchsorted(plan_ids, payments['plan']), len(plan_ids) - 1)
+    payments['duration'] = np.where(plan_ids[index] == payments['plan'], durations[index], 0)
+    return payments
+
+
+def _active_members(payments, boundaries):
+    """Boolean (members x boundaries) matrix: is each member covered on
+    each boundary day?"""
+    recurring = payments['duration'] > 0
+    member = payments['member'][recurring]
+    starts = payments['day'][recurring]
+    ends = starts + payments['duration'][recurring]
+    if not len(member):
+        return np.zeros((0, len(boundaries)), dtype=bool)
+    covered = (starts[:, None] <= boundaries) & (boundaries < ends[:, None])
+    order = np.argsort(member, kind='stable')
+    member, covered = member[order], covered[order]
+    first_rows = np.flatnonzero(np.r_[True, member[1:] != member[:-1]])
+    return np.logical_or.reduceat(covered, first_rows, axis=0)
+
+
+def _mrr(payments, boundaries):
+    """Monthly-normalised value of the coverage in force on each boundary day, in cents."""
+    recurring = payments['duration'] > 0
+    if not recurring.any():
+        return np.zeros(len(boundaries))
+    starts = payments['day'][recurring]
+    ends = starts + payments['duration'][recurring]
+    monthly = payments['cents'][recurring] * DAYS_PER_MONTH / payments['duration'][recurring]
+    # Sweep line: +value when coverage starts, -value when it ends
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([monthly, -monthly])
+    order = np.argsort(times, kind='stable')
+    times, running = times[order], np.cumsum(deltas[order])
+    index = np.searchsorted(times, boundaries, side='right') - 1
+    return np.where(index >= 0, running[np.maximum(index, 0)], 0.0)
+
+
+def _growth(values):
+    # Period-over-period growth; None where the previous value is zero
+    previous, current = values[:-1], values[1:]
+    growth = np.divide(current - previous, previous, out=np.full(len(current), np.nan), where=previous != 0)
+    return [None] + [None if np.isnan(value) else round(float(value), 4) for value in growth]
+
+
+def _money(cents):
+    return from_cents(int(round(cents)))
+
+
+def compute_revenue_report(start, end, today=None):
+    """Monthly revenue, MRR, churn and growth, per-plan revenue and
+    churn-adjusted lifetime value for the months `start`..`end` touch."""
+    today = today or date.today()
+    months = np.arange(np.datetime64(start, 'M'), np.datetime64(end, 'M') + 1)
+    month_starts = months.astype('datetime64[D]').astype(np.int64)
+    next_month_starts = (months + 1).astype('datetime64[D]').astype(np.int64)
+    first, last = _to_epoch_day(start), _to_epoch_day(end)
+    period_days = last - first + 1
+
+    # Coverage in force during the range can come from payments made up to
+    # one plan duration before it; the previous period is for growth.
+    plans = db.session.execute(
+        db.select(MembershipPlan.id, MembershipPlan.name, MembershipPlan.duration_days)
+    ).all()
+    plan_durations = {plan.id: plan.duration_days for plan in plans}
+    lookback = timedelta(days=max(max(plan_durations.values(), default=0), period_days))
+    load_from = start - lookback if start - date.min > lookback else date.min
+    payments = load_payments(load_from, end, plan_durations)
+    day, cents = payments['day'], payments['cents']
+
+    in_range = (day >= first) & (day <= last)
+    month_index = (_month_start(day[in_range]) - months[0]).astype(np.int64)
+    revenue = np.bincount(month_index, weights=cents[in_range], minlength=len(months))
+    payment_counts = np.bincount(month_index, minlength=len(months))
+    previous_revenue = cents[(day >= first - period_days) & (day < first)].sum()
+
+    # Coverage is judged on each month's first day and the next month's,
+    # but never past today (the future hasn't churned yet).
+    boundaries = np.minimum(np.concatenate([month_starts, next_month_starts[-1:]]), _to_epoch_day(today))
+    active = _active_members(payments, boundaries)
+    active_at_start = active[:, :-1].sum(axis=0)
+    churned = (active[:, :-1] & ~active[:, 1:]).sum(axis=0)
+    churn_rate = np.divide(churned, active_at_start, out=np.zeros(len(months)), where=active_at_start > 0)
+    mrr = _mrr(payments, np.minimum(next_month_starts - 1, _to_epoch_day(today)))
+
+    member_months = active_at_start.sum()
+    arpu = revenue.sum() / member_months if member_months else None
+    average_churn = churned.sum() / member_months if member_months else None
+    lifetime_value = arpu / average_churn if arpu is not None and average_churn else None
+
+    # Revenue per plan over the range
+    plan_ids, plan_index = np.unique(payments['plan'][in_range], return_inverse=True)
+    plan_revenue = np.bincount(plan_index, weights=cents[in_range], minlength=len(plan_ids))
+    plan_payments = np.bincount(plan_index, minlength=len(plan_ids))
+    plan_names = {plan.id: plan.name for plan in plans}
+    total = revenue.sum()
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'months': [{
+            'month': str(month),
+            'revenue': _money(revenue[i]),
+            'payments': int(payment_counts[i]),
+            'mrr': _money(mrr[i]),
+            'active_members': int(active_at_start[i]),
+            'churned_members': int(churned[i]),
+            'churn_rate': round(float(churn_rate[i]), 4),
+            'revenue_growth': revenue_growth,
+            'mrr_growth': mrr_growth,
+        } for i, (month, revenue_growth, mrr_growth)
+            in enumerate(zip(months, _growth(revenue), _growth(mrr)))],
+        'plans': [{
+            'plan_id': int(plan_id) if plan_id != NO_PLAN else None,
+            'name': plan_names.get(int(plan_id), 'No plan' if plan_id == NO_PLAN else 'Deleted plan'),
+            'payments': int(plan_payments[i]),
+            'revenue': _money(plan_revenue[i]),
+            'share': round(float(plan_revenue[i] / total), 4) if total else None,
+        } for i, plan_id in sorted(enumerate(plan_ids), key=lambda item: -plan_revenue[item[0]])],
+        'totals': {
+            'revenue': _money(total),
+            'payments': int(in_range.sum()),
+            'previous_period_revenue': _money(previous_revenue),
+            'growth': round(float((total - previous_revenue) / previous_revenue), 4) if previous_revenue else None,
+            'arpu_per_month': _money(arpu) if arpu is not None else None,
+            'monthly_churn_rate': round(float(average_churn), 4) if average_churn is not None else None,
+            'lifetime_value': _money(lifetime_value) if lifetime_value is not None else None,
+        },
+    }
+
+
+def get_revenue_report(start, end):
+    """compute_revenue_report() cached until payments or plans are written
+    or REVENUE_REPORT_CACHE_TTL passes."""
+    _cache.ttl = current_app.config['REVENUE_REPORT_CACHE_TTL']
+    today = date.today()
+    key = (start, end, today)
+    version = cache_version('payment', 'membership_plan')
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    result = compute_revenue_report(start, end, today)
+    _cache.set(key, (version, result))
+    return result
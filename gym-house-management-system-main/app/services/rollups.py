@@ -0,0 +1,184 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import db
+from app.cache import mark_written
+from app.money import from_cents, to_cents
+from app.models import Attendance, AttendanceRollup, Payment, RevenueRollup
+
+# Rollups are updated in the same transaction as the check-ins and payments
+# they count: ORM writes through the flush hook below, bulk executemany
+# inserts by calling add_check_ins()/add_payments() themselves. Changing an
+# existing row's check-in time, payment date or amount is not tracked;
+# run `flask rebuild-rollups` for the affected days after such a fix-up.
+
+NO_PLAN = 0
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _increment(connection, model, keys, deltas):
+    """Add `deltas` ({key tuple: {column: delta}}) to the rollup rows of `model`."""
+    if not deltas:
+        return
+    table = model.__table__
+    rows = [dict(zip(keys, key), **values) for key, values in deltas.items()]
+    columns = list(rows[0].keys() - set(keys))
+
+    upsert = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={table.c[column]: table.c[column] + stmt.excluded[column] for column in columns}
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        match = [table.c[key] == row[key] for key in keys]
+        updated = connection.execute(
+            table.update().where(*match).values({column: table.c[column] + row[column] for column in columns})
+        )
+        if not updated.rowcount:
+            connection.execute(table.insert().values(row))
+
+
+def _check_in_deltas(check_in_times, sign=1):
+    counts = Counter((value.date(), value.hour) for value in check_in_times)
+    return {key: {'check_ins': sign * count} for key, count in counts.items()}
+
+
+def _payment_deltas(payments, sign=1):
+    # Amounts are summed as exact Decimals, like the cents they are stored as
+    deltas = defaultdict(lambda: {'payments': 0, 'amount': Decimal(0)})
+    for payment_date, plan_id, amount in payments:
+        delta = deltas[(_day(payment_date), plan_id or NO_PLAN)]
+        delta['payments'] += sign
+        delta['amount'] += sign * from_cents(to_cents(amount))
+    return dict(deltas)
+
+
+def add_check_ins(session, rows):
+    """Count bulk-inserted attendance rows (dicts with `check_in_time`)."""
+    _increment(session.connection(), AttendanceRollup, ['day', 'hour'],
+               _check_in_deltas(row['check_in_time'] for row in rows))
+    mark_written(session, 'attendance_rollup')
+
+
+def add_payments(session, rows):
+    """Count bulk-inserted payment rows (dicts with payment_date, plan_id, amount)."""
+    _increment(session.connection(), RevenueRollup, ['day', 'plan_id'],
+               _payment_deltas((row['payment_date'], row.get('plan_id'), row['amount']) for row in rows))
+    mark_written(session, 'revenue_rollup')
+
+
+@event.listens_for(Session, 'after_flush')
+def _roll_up_flushed_rows(session, flush_context):
+    added = list(session.new)
+    deleted = list(session.deleted)
+    check_ins = _check_in_deltas(obj.check_in_time for obj in added if isinstance(obj, Attendance))
+    for key, delta in _check_in_deltas((obj.check_in_time for obj in deleted if isinstance(obj, Attendance)),
+                                       sign=-1).items():
+        check_ins.setdefault(key, {'check_ins': 0})['check_ins'] += delta['check_ins']
+
+    payments = _payment_deltas((obj.payment_date, obj.plan_id, obj.amount)
+                               for obj in added if isinstance(obj, Payment))
+    for key, delta in _payment_deltas(((obj.payment_date, obj.plan_id, obj.amount)
+                                       for obj in deleted if isinstance(obj, Payment)), sign=-1).items():
+        total = payments.setdefault(key, {'payments': 0, 'amount': Decimal(0)})
+        total['payments'] += delta['payments']
+        total['amount'] += delta['amount']
+
+    if check_ins or payments:
+        connection = session.connection()
+        _increment(connection, AttendanceRollup, ['day', 'hour'], check_ins)
+        _increment(connection, RevenueRollup, ['day', 'plan_id'], payments)
+
+
+def rebuild(start=None, end=None):
+    """Recompute the rollups for days `start`..`end` (inclusive; open-ended if None).
+
+    Use after backfills or direct SQL edits. Returns (attendance, revenue)
+    rollup rows written.
+    """
+    attendance_filter, revenue_filter = [], []
+    rollup_filters = {AttendanceRollup: [], RevenueRollup: []}
+    if start:
+        attendance_filter.append(Attendance.check_in_time >= datetime.combine(start, time.min))
+        revenue_filter.append(Payment.payment_date >= start)
+        for model, filters in rollup_filters.items():
+            filters.append(model.day >= start)
+    if end:
+        attendance_filter.append(Attendance.check_in_time < datetime.combine(end + timedelta(days=1), time.min))
+        revenue_filter.append(Payment.payment_date <= end)
+        for model, filters in rollup_filters.items():
+            filters.append(model.day <= end)
+
+    for model, filters in rollup_filters.items():
+        db.session.execute(db.delete(model).where(*filters))
+
+    day = db.func.date(Attendance.check_in_time)
+    hour = db.extract('hour', Attendance.check_in_time)
+    attendance = db.session.execute(
+        db.insert(AttendanceRollup).from_select(
+            ['day', 'hour', 'check_ins'],
+            db.select(day, hour, db.func.count(Attendance.id))
+            .where(*attendance_filter).group_by(day, hour)
+        )
+    ).rowcount
+
+    plan_id = db.func.coalesce(Payment.plan_id, NO_PLAN)
+    revenue = db.session.execute(
+        db.insert(RevenueRollup).from_select(
+            ['day', 'plan_id', 'payments', 'amount'],
+            db.select(Payment.payment_date, plan_id, db.func.count(Payment.id), db.func.sum(Payment.amount))
+            .where(*revenue_filter).group_by(Payment.payment_date, plan_id)
+        )
+    ).rowcount
+
+    mark_written(db.session, 'attendance_rollup', 'revenue_rollup')
+    db.session.commit()
+    return attendance, revenue
+
+
+# --- Reporting queries ---
+
+def daily_check_ins(start, end):
+    """(day, check_ins) for each day with check-ins between start and end."""
+    return db.session.execute(
+        db.select(AttendanceRollup.day, db.func.sum(AttendanceRollup.check_ins).label('check_ins'))
+        .where(AttendanceRollup.day.between(start, end))
+        .group_by(AttendanceRollup.day).order_by(AttendanceRollup.day)
+    ).all()
+
+
+def check_ins_by_hour(start, end):
+    """(hour, check_ins) summed over the days between start and end."""
+    return db.session.execute(
+        db.select(AttendanceRollup.hour, db.func.sum(AttendanceRollup.check_ins).label('check_ins'))
+        .where(AttendanceRollup.day.between(start, end))
+        .group_by(AttendanceRollup.hour).order_by(AttendanceRollup.hour)
+    ).all()
+
+
+def revenue_by_plan(start=None, end=None):
+    """(plan_id, payments, amount) per plan; plan_id is NO_PLAN for plan-less payments."""
+    filters = []
+    if start:
+        filters.append(RevenueRollup.day >= start)
+    if end:
+        filters.append(RevenueRollup.day <= end)
+    return db.session.execute(
+        db.select(RevenueRollup.plan_id,
+                  db.func.sum(RevenueRollup.payments).label('payments'),
+                  db.func.sum(RevenueRollup.amount).label('amount'))
+        .where(*filters).group_by(RevenueRollup.plan_id).order_by(RevenueRollup.plan_id)
+    ).all()
@@ -0,0 +1,255 @@
+import re
+from collections import defaultdict
+from itertools import chain
+from sqlalchemy import event, bindparam, text
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Inquiry, Member, Trainer, WorkoutPlan
+
+# Full-text search over members, inquiries, trainers and workout plans.
+# Every indexed row becomes one document (kind, ref_id, title, body) in a
+# search table owned by the backend for the current database: an FTS5
+# virtual table on SQLite, a tsvector column with a GIN index on PostgreSQL.
+# Documents are rewritten inside the flush that changes their row, and
+# `flask rebuild-search-index` regenerates the whole index with one
+# INSERT ... SELECT per kind.
+
+# kind: (model, code, title attribute, body attributes). A document's key is
+# ref_id * len(DOCUMENTS) + code, so it is the search table's integer
+# primary key and is found without scanning.
+DOCUMENTS = {
+    'member': (Member, 0, 'name', ('email', 'phone')),
+    'inquiry': (Inquiry, 1, 'name', ('email', 'message')),
+    'trainer': (Trainer, 2, 'name', ('specialization', 'schedule')),
+    'workout_plan': (WorkoutPlan, 3, 'name', ('description', 'routines')),
+}
+_KINDS_BY_MODEL = {model: kind for kind, (model, *_) in DOCUMENTS.items()}
+
+MAX_TERMS = 8
+# See SQLiteFTSBackend.search()
+RANK_CANDIDATES = 2000
+
+
+def document_key(kind, ref_id):
+    return ref_id * len(DOCUMENTS) + DOCUMENTS[kind][1]
+
+
+def documents_select(kind, ids=None):
+    """SELECT of (key, kind, ref_id, title, body) rows for `kind`, optionally
+    only for the rows with the given ids."""
+    model, code, title, body = DOCUMENTS[kind]
+    text_columns = [db.func.coalesce(getattr(model, name), '') for name in body]
+    body_expression = text_columns[0]
+    for column in text_columns[1:]:
+        body_expression = body_expression + ' ' + column
+    statement = db.select(
+        (model.id * len(DOCUMENTS) + code).label('key'),
+        db.literal(kind, db.String).label('kind'),
+        model.id.label('ref_id'),
+        db.func.coalesce(getattr(model, title), '').label('title'),
+        body_expression.label('body'),
+    )
+    if ids is not None:
+        statement = statement.where(model.id.in_(ids))
+    return statement
+
+
+def query_terms(query):
+    # Letters and digits only: the terms are spliced into the backend's
+    # query syntax, so nothing else may get through.
+    return re.findall(r'[^\W_]+', query.lower())[:MAX_TERMS]
+
+
+class SQLiteFTSBackend:
+    """FTS5 virtual table with bm25 ranking (name weighted above the rest)."""
+
+    table = db.table('search_index', db.column('rowid'), db.column('kind'), db.column('ref_id'),
+                     db.column('title'), db.column('body'))
+
+    def create(self, connection):
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        # Persist the ranking so ORDER BY rank uses it
+        connection.exec_driver_sql(
+            "INSERT INTO search_index(search_index, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 1.0)')"
+        )
+
+    def drop(self, connection):
+        connection.exec_driver_sql('DROP TABLE IF EXISTS search_index')
+
+    def delete(self, connection, keys=None):
+        statement = self.table.delete()
+        if keys is not None:
+            statement = statement.where(self.table.c.rowid.in_(keys))
+        connection.execute(statement)
+
+    def insert_from(self, connection, select):
+        connection.execute(self.table.insert().from_select(['rowid', 'kind', 'ref_id', 'title', 'body'], select))
+
+    def optimize(self, connection):
+        connection.exec_driver_sql("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+    def search(self, connection, terms, kinds, limit):
+        # Every term must match the start of a token
+        params = {'match': ' '.join(f'"{term}"*' for term in terms), 'limit': limit,
+                  'offset': RANK_CANDIDATES - 1}
+        where = 'search_index MATCH :match'
+        if kinds:
+            where += ' AND kind IN :kinds'
+            params['kinds'] = list(kinds)
+
+        def statement(sql):
+            sql = text(sql)
+            return sql.bindparams(bindparam('kinds', expanding=True)) if kinds else sql
+
+        # bm25 costs about a microsecond per matching document, so a short,
+        # common prefix would rank tens of thousands of them. Only the newest
+        # RANK_CANDIDATES matches are ranked; FTS5 applies the rowid bound
+        # before scoring.
+        params['floor'] = connection.execute(statement(
+            f'SELECT rowid FROM search_index WHERE {where} ORDER BY rowid DESC LIMIT 1 OFFSET :offset'
+        ), params).scalar() or 0
+        return connection.execute(statement(
+            "SELECT kind, ref_id, title, snippet(search_index, 3, '', '', '…', 12) AS snippet "
+            f"FROM search_index WHERE {where} AND rowid >= :floor ORDER BY rank LIMIT :limit"
+        ), params).all()
+
+
+class PostgresBackend:
+    """Plain table with a generated, GIN-indexed tsvector, ranked by ts_rank."""
+
+    table = db.table('search_document', db.column('rowid'), db.column('kind'), db.column('ref_id'),
+                     db.column('title'), db.column('body'))
+
+    def create(self, connection):
+        connection.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS search_document ("
+            "rowid BIGINT PRIMARY KEY, kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, "
+            "title TEXT NOT NULL, body TEXT NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+            ") STORED)"
+        )
+        connection.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_search_document_document ON search_document USING GIN (document)'
+        )
+
+    def drop(self, connection):
+        connection.exec_driver_sql('DROP TABLE IF EXISTS search_document')
+
+    def delete(self, connection, keys=None):
+        statement = self.table.delete()
+        if keys is not None:
+            statement = statement.where(self.table.c.rowid.in_(keys))
+        connection.execute(statement)
+
+    def insert_from(self, connection, select):
+        connection.execute(self.table.insert().from_select(['rowid', 'kind', 'ref_id', 'title', 'body'], select))
+
+    def optimize(self, connection):
+        connection.exec_driver_sql('ANALYZE search_document')
+
+    def search(self, connection, terms, kinds, limit):
+        sql = ("SELECT kind, ref_id, title, left(body, 120) AS snippet "
+               "FROM search_document, to_tsquery('simple', :query) AS query WHERE document @@ query")
+        if kinds:
+            sql += ' AND kind IN :kinds'
+        statement = text(sql + ' ORDER BY ts_rank(document, query) DESC LIMIT :limit')
+        params = {'query': ' & '.join(f'{term}:*' for term in terms), 'limit': limit}
+        if kinds:
+            statement = statement.bindparams(bindparam('kinds', expanding=True))
+            params['kinds'] = list(kinds)
+        return connection.execute(statement, params).all()
+
+
+BACKENDS = {'sqlite': SQLiteFTSBackend(), 'postgresql': PostgresBackend()}
+
+
+def get_backend(connection):
+    """The search backend for `connection`'s database, or None if unsupported."""
+    return BACKENDS.get(connection.dialect.name)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_table(metadata, connection, **kw):
+    # So db.create_all() (tests, benchmarks) gets the index too
+    backend = get_backend(connection)
+    if backend is not None:
+        backend.create(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_table(metadata, connection, **kw):
+    backend = get_backend(connection)
+    if backend is not None:
+        backend.drop(connection)
+
+
+def reindex(connection, kind, ids):
+    """Rewrite the documents for rows `ids` of `kind` from the database."""
+    backend = get_backend(connection)
+    ids = list(ids)
+    if backend is None or not ids:
+        return
+    backend.delete(connection, [document_key(kind, ref_id) for ref_id in ids])
+    backend.insert_from(connection, documents_select(kind, ids))
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    changed, removed = defaultdict(set), defaultdict(set)
+    for obj in chain(session.new, session.dirty):
+        kind = _KINDS_BY_MODEL.get(type(obj))
+        if kind and session.is_modified(obj, include_collections=False):
+            changed[kind].add(obj.id)
+    for obj in session.deleted:
+        kind = _KINDS_BY_MODEL.get(type(obj))
+        if kind:
+            removed[kind].add(obj.id)
+    if not (changed or removed):
+        return
+
+    connection = session.connection()
+    backend = get_backend(connection)
+    if backend is None:
+        return
+    for kind, ids in changed.items():
+        reindex(connection, kind, ids)
+    keys = [document_key(kind, ref_id) for kind, ids in removed.items() for ref_id in ids]
+    if keys:
+        backend.delete(connection, keys)
+
+
+def rebuild():
+    """Regenerate the whole index; returns the number of documents per kind."""
+    connection = db.session.connection()
+    backend = get_backend(connection)
+    if backend is None:
+        raise RuntimeError(f'Full-text search is not supported on {connection.dialect.name}')
+    backend.delete(connection)
+    counts = {}
+    for kind in DOCUMENTS:
+        backend.insert_from(connection, documents_select(kind))
+        counts[kind] = db.session.execute(db.select(db.func.count()).select_from(DOCUMENTS[kind][0])).scalar()
+    backend.optimize(connection)
+    db.session.commit()
+    return counts
+
+
+def search(query, kinds=None, limit=20):
+    """Best matches for `query` as (kind, ref_id, title, snippet) rows.
+
+    Each word in the query must match the start of a word in the document.
+    Returns None if the database has no search backend.
+    """
+    connection = db.session.connection()
+    backend = get_backend(connection)
+    if backend is None:
+        return None
+    terms = query_terms(query)
+    if not terms:
+        return []
+    return backend.search(connection, terms, kinds, limit)
@@ -0,0 +1,59 @@
+from datetime import datetime
+from itertools import islice
+from app import db
+from app.cache import mark_written
+from app.models import Attendance
+
+# Every query here filters on check_out_time IS NULL so it is answered from
+# the partial index ix_attendance_open, whose size is the number of open
+# visits rather than the number of check-ins ever recorded.
+
+
+def _is_open():
+    return Attendance.check_out_time.is_(None)
+
+
+def open_visits_query(max_age):
+    """Open visits that started within `max_age`, newest first."""
+    return Attendance.query.filter(_is_open(), Attendance.check_in_time >= datetime.utcnow() - max_age)
+
+
+def live_occupancy_statement(max_age):
+    return (
+        db.select(db.func.count())
+        .select_from(Attendance)
+        .where(_is_open(), Attendance.check_in_time >= datetime.utcnow() - max_age)
+    )
+
+
+def live_occupancy(max_age):
+    """How many members are checked in and not out, ignoring visits older
+    than `max_age` that were never closed."""
+    return db.session.execute(live_occupancy_statement(max_age)).scalar()
+
+
+def close_stale_visits(max_age, assumed_duration, chunk_size=1000):
+    """Check out visits open for longer than `max_age`.
+
+    Their check-out time is set to check-in + `assumed_duration`, since the
+    real one is unknown. Returns the number of visits closed.
+    """
+    cutoff = datetime.utcnow() - max_age
+    stale = db.session.execute(
+        db.select(Attendance.id, Attendance.check_in_time)
+        .where(_is_open(), Attendance.check_in_time < cutoff)
+    ).all()
+
+    closed = 0
+    rows = iter(stale)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return closed
+        db.session.execute(db.update(Attendance), [
+            {'id': visit_id, 'check_out_time': check_in_time + assumed_duration}
+            for visit_id, check_in_time in chunk
+        ])
+        mark_written(db.session, 'attendance')
+        db.session.commit()
+        closed += len(chunk)
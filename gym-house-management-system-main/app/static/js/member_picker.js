@@ -0,0 +1,35 @@
+// Type-ahead member picker: fills a <datalist> from /members/search and copies
+// the chosen member's id into the hidden form field named by data-member-picker.
+document.querySelectorAll('[data-member-picker]').forEach(function (input) {
+    var hidden = document.getElementById(input.dataset.memberPicker);
+    var options = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+
+    function optionLabel(member) {
+        return member.name + ' <' + member.email + '>';
+    }
+
+    input.addEventListener('input', function () {
+        var match = Array.prototype.find.call(options.options, function (option) {
+            return option.value === input.value;
+        });
+        hidden.value = match ? match.dataset.id : '';
+        if (match || input.value.trim().length < 2) {
+            return;
+        }
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            fetch(input.dataset.searchUrl + '?q=' + encodeURIComponent(input.value.trim()))
+                .then(function (response) { return response.json(); })
+                .then(function (members) {
+                    options.innerHTML = '';
+                    members.forEach(function (member) {
+                        var option = document.createElement('option');
+                        option.value = optionLabel(member);
+                        option.dataset.id = member.id;
+                        options.appendChild(option);
+                    });
+                });
+        }, 200);
+    });
+});
@@ -0,0 +1,126 @@
+"""Synthetic gym dataset for the benchmarks.
+
+Generates plans, trainers, workout plans, members with monthly payment
+history and `years` of attendance, plus an admin and a subscription user.
+Rows are written with executemany inserts in chunks, so a dataset with
+hundreds of thousands of check-ins builds in seconds, and the attendance
+and revenue rollups, membership statuses and search index are then
+derived from them.
+The same seed always produces the same data.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from app import db
+from app.models import Attendance, Inquiry, Member, MembershipPlan, Payment, Trainer, User, WorkoutPlan
+from app.services import rollups, search
+from app.services.memberships import refresh_statuses
+from app.services.hashing import get_password_hasher
+
+ADMIN = ('bench-admin', 'password')
+SUBSCRIBER = ('bench-member', 'password')
+
+PLANS = [('Monthly Basic', 30, 30.0), ('Quarterly', 90, 80.0), ('Yearly Premium', 365, 300.0)]
+
+
+class DatasetSize:
+    def __init__(self, members=1000, years=2, visits_per_week=3, trainers=20, workout_plans=30, inquiries=500):
+        self.members = members
+        self.years = years
+        self.visits_per_week = visits_per_week
+        self.trainers = trainers
+        self.workout_plans = workout_plans
+        self.inquiries = inquiries
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _insert_chunked(model, rows, chunk_size=5000):
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return count
+        db.session.execute(db.insert(model), chunk)
+        count += len(chunk)
+
+
+def _member_rows(size, rng, today, plan_ids):
+    first_day = today - timedelta(days=365 * size.years)
+    for n in range(size.members):
+        join_date = first_day + timedelta(days=rng.randrange(365 * size.years))
+        end_date = today + timedelta(days=rng.randint(-60, 300))
+        yield {
+            'name': f'Member {n:06d} {rng.choice("ABCDEFGHJKLMNPRSTW")}',
+            'email': f'member{n}@bench.example.com',
+            'phone': f'555-{n:07d}',
+            'join_date': join_date,
+            'membership_plan_id': rng.choice(plan_ids),
+            'membership_start_date': join_date,
+            'membership_end_date': end_date,
+            'trainer_id': rng.randint(1, size.trainers) if size.trainers and rng.random() < 0.5 else None,
+            'workout_plan_id': rng.randint(1, size.workout_plans) if size.workout_plans and rng.random() < 0.5 else None,
+        }
+
+
+def _payment_rows(members, rng, today, plan_ids):
+    # One payment per month of membership
+    for member_id, join_date in members:
+        payment_date = join_date
+        while payment_date <= today:
+            yield {'member_id': member_id, 'amount': 30.0, 'payment_date': payment_date,
+                   'plan_id': rng.choice(plan_ids)}
+            payment_date += timedelta(days=30)
+
+
+def _attendance_rows(members, size, rng, today):
+    visit_chance = size.visits_per_week / 7
+    for member_id, join_date in members:
+        day = join_date
+        while day <= today:
+            if rng.random() < visit_chance:
+                check_in = datetime.combine(day, time(rng.randint(6, 21), rng.randrange(60)))
+                check_out = check_in + timedelta(minutes=rng.randint(30, 120)) if day < today else None
+                yield {'member_id': member_id, 'check_in_time': check_in, 'check_out_time': check_out}
+            day += timedelta(days=1)
+
+
+def generate(size, seed=1):
+    """Fill an empty database; returns row counts per table."""
+    rng = random.Random(seed)
+    today = date.today()
+    counts = {}
+
+    counts['membership_plan'] = _insert_chunked(MembershipPlan, (
+        {'name': name, 'duration_days': days, 'price': price} for name, days, price in PLANS))
+    counts['trainer'] = _insert_chunked(Trainer, (
+        {'name': f'Trainer {n}', 'specialization': 'Strength', 'schedule': 'Mon-Fri 6-14'}
+        for n in range(size.trainers)))
+    counts['workout_plan'] = _insert_chunked(WorkoutPlan, (
+        {'name': f'Workout {n}', 'description': 'Full body', 'routines': 'Squat, bench, row'}
+        for n in range(size.workout_plans)))
+    plan_ids = db.session.execute(db.select(MembershipPlan.id)).scalars().all()
+
+    counts['member'] = _insert_chunked(Member, _member_rows(size, rng, today, plan_ids))
+    members = db.session.execute(db.select(Member.id, Member.join_date).order_by(Member.id)).all()
+    counts['payment'] = _insert_chunked(Payment, _payment_rows(members, rng, today, plan_ids))
+    counts['attendance'] = _insert_chunked(Attendance, _attendance_rows(members, size, rng, today))
+    counts['inquiry'] = _insert_chunked(Inquiry, (
+        {'name': f'Prospect {n}', 'email': f'prospect{n}@bench.example.com', 'message': 'Opening hours?',
+         'submitted_at': datetime.combine(today, time()) - timedelta(hours=n)}
+        for n in range(size.inquiries)))
+
+    # The subscription user is linked to the first member
+    admin_hash, subscriber_hash = get_password_hasher().hash_many([ADMIN[1], SUBSCRIBER[1]])
+    counts['user'] = _insert_chunked(User, [
+        {'username': ADMIN[0], 'email': 'admin@bench.example.com', 'password_hash': admin_hash, 'role': 'admin'},
+        {'username': SUBSCRIBER[0], 'email': 'member0@bench.example.com', 'password_hash': subscriber_hash,
+         'role': 'subscription', 'member_id': members[0].id},
+    ])
+    db.session.commit()
+    rollups.rebuild()
+    refresh_statuses()
+    search.rebuild()
+    return counts
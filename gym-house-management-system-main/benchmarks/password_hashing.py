@@ -0,0 +1,107 @@
+"""Login latency and bulk account-creation throughput for bcrypt settings.
+
+    python -m benchmarks.password_hashing --rounds 12 --pool-sizes 1,2,4,8
+
+Login p50/p99 is measured through the Flask test client with --concurrency
+threads logging in at once, for each login verification pool size. Bulk
+throughput is passwords hashed per second for each hashing process pool size.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from config import Config
+from app import create_app, db
+from app.models import User
+from app.services.hashing import PasswordHasher
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def make_app(rounds, db_path):
+    class BenchConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        BCRYPT_LOG_ROUNDS = rounds
+    return create_app(BenchConfig)
+
+
+def bench_logins(app, pool_size, concurrency, logins_per_thread):
+    app.extensions['password_hasher'] = PasswordHasher(app.config['BCRYPT_LOG_ROUNDS'], 1, pool_size)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        client = app.test_client()
+        for _ in range(logins_per_thread):
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': f'user{n}', 'password': 'password'})
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 302, response.status_code
+            client.get('/logout')
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    app.extensions.pop('password_hasher').shutdown()
+    return latencies, wall
+
+
+def bench_bulk_hashing(rounds, pool_size, count):
+    hasher = PasswordHasher(rounds, pool_size, 1)
+    hasher.hash_many(['warm-up'] * pool_size * 2)  # start the worker processes
+    started = time.perf_counter()
+    hasher.hash_many(['password'] * count)
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=Config.BCRYPT_LOG_ROUNDS)
+    parser.add_argument('--pool-sizes', default='1,2,4,8')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent login threads.')
+    parser.add_argument('--logins', type=int, default=4, help='Logins per thread.')
+    parser.add_argument('--bulk-count', type=int, default=200, help='Passwords hashed per bulk run.')
+    args = parser.parse_args()
+    pool_sizes = [int(size) for size in args.pool_sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(args.rounds, os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            hashes = PasswordHasher(args.rounds, os.cpu_count() or 1, 1).hash_many(['password'] * args.concurrency)
+            db.session.add_all(User(username=f'user{n}', email=f'user{n}@example.com', password_hash=password_hash)
+                               for n, password_hash in enumerate(hashes))
+            db.session.commit()
+
+        print(f'bcrypt rounds={args.rounds}, {args.concurrency} concurrent clients x {args.logins} logins')
+        print(f'{"verify pool":>12} {"p50 ms":>9} {"p99 ms":>9} {"logins/s":>9}')
+        for size in pool_sizes:
+            latencies, wall = bench_logins(app, size, args.concurrency, args.logins)
+            print(f'{size:>12} {statistics.median(latencies) * 1000:>9.1f} '
+                  f'{percentile(latencies, 99) * 1000:>9.1f} {len(latencies) / wall:>9.1f}')
+
+    print()
+    print(f'Bulk hashing, {args.bulk_count} passwords')
+    print(f'{"hash pool":>12} {"hashes/s":>9}')
+    for size in pool_sizes:
+        print(f'{size:>12} {bench_bulk_hashing(args.rounds, size, args.bulk_count):>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Concurrency stress test for payments that extend memberships.
+
+    python -m benchmarks.payment_concurrency --threads 16 --payments 25 --members 4
+
+--threads workers each record --payments payments for a plan, spread over
+only --members members so they collide constantly. Afterwards every
+member's end date must be exactly the initial end date plus one plan
+duration per payment, and the payment count and revenue rollup must match
+what was submitted; the script exits non-zero otherwise. Runs on a
+temporary SQLite file unless --database-url points at a scratch database
+(its tables are dropped and recreated).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from config import Config
+from app import create_app, db
+from app.models import Member, MembershipPlan, Payment, RevenueRollup
+from app.services.ledger import record_payment
+
+PLAN_DAYS = 30
+PRICE = Decimal('30.00')
+
+
+def make_app(database_url):
+    class StressConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = database_url
+        NOTIFICATION_TRANSPORT = 'file'
+        MEMBERSHIP_UPDATE_RETRIES = 50
+    return create_app(StressConfig)
+
+
+def setup(members, today):
+    db.drop_all()
+    db.create_all()
+    plan = MembershipPlan(name='Monthly', duration_days=PLAN_DAYS, price=PRICE)
+    db.session.add(plan)
+    db.session.add_all(Member(name=f'Member {n}', email=f'member{n}@stress.example.com', join_date=today,
+                              membership_start_date=today, membership_end_date=today + timedelta(days=1))
+                       for n in range(members))
+    db.session.commit()
+    return plan.id, db.session.execute(db.select(Member.id, Member.membership_end_date)).all()
+
+
+def run(app, plan_id, member_ids, threads, payments, today, seed):
+    submitted = Counter()
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        with app.app_context():
+            barrier.wait()
+            for _ in range(payments):
+                member_id = rng.choice(member_ids)
+                try:
+                    record_payment(member_id, PRICE, today, plan_id=plan_id)
+                except Exception as exc:
+                    with lock:
+                        errors.append(f'{type(exc).__name__}: {exc}')
+                    continue
+                with lock:
+                    submitted[member_id] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return submitted, errors, time.perf_counter() - started
+
+
+def check(initial_ends, submitted):
+    problems = []
+    ends = dict(db.session.execute(db.select(Member.id, Member.membership_end_date)).all())
+    for member_id, initial_end in initial_ends:
+        expected = initial_end + timedelta(days=PLAN_DAYS * submitted[member_id])
+        if ends[member_id] != expected:
+            problems.append(f'member {member_id}: end date {ends[member_id]}, expected {expected} '
+                            f'after {submitted[member_id]} payments')
+    payments = db.session.execute(db.select(db.func.count()).select_from(Payment)).scalar()
+    if payments != sum(submitted.values()):
+        problems.append(f'{payments} payments stored, {sum(submitted.values())} recorded')
+    rolled_up = db.session.execute(db.select(db.func.sum(RevenueRollup.payments))).scalar() or 0
+    if rolled_up != payments:
+        problems.append(f'revenue rollup counts {rolled_up} payments, table has {payments}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--payments', type=int, default=25, help='Payments per thread.')
+    parser.add_argument('--members', type=int, default=4, help='Members the payments are spread over.')
+    parser.add_argument('--database-url', help='Scratch database to use instead of a temporary SQLite file.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(args.database_url or 'sqlite:///' + os.path.join(tmp, 'stress.db'))
+        app.config['NOTIFICATION_FILE'] = os.path.join(tmp, 'outbox.jsonl')
+        today = date.today()
+        with app.app_context():
+            plan_id, initial_ends = setup(args.members, today)
+        member_ids = [member_id for member_id, _ in initial_ends]
+
+        submitted, errors, elapsed = run(app, plan_id, member_ids, args.threads, args.payments, today, args.seed)
+        with app.app_context():
+            problems = check(initial_ends, submitted)
+
+    total = sum(submitted.values())
+    print(f'{total} payments from {args.threads} threads over {args.members} members '
+          f'in {elapsed:.2f}s ({total / elapsed:.0f}/s), {len(errors)} gave up')
+    for error in errors[:5]:
+        print(f'  {error}')
+    for problem in problems:
+        print(f'FAIL {problem}')
+    if problems:
+        sys.exit(1)
+    print('OK: every end date is exactly additive')
+
+
+if __name__ == '__main__':
+    main()
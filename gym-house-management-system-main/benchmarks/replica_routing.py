@@ -0,0 +1,116 @@
+"""Read-replica routing check on two local SQLite files.
+
+    python -m benchmarks.replica_routing --members 500
+
+Builds a synthetic dataset (benchmarks.dataset) in a primary SQLite file,
+copies it to a replica file with sync_sqlite_replicas() (the stand-in for
+replication), then:
+
+  - requests the replica-routed pages and counts the statements each
+    database ran, expecting the page's own reads on the replica;
+  - records a plan as the admin and checks that the admin's next page
+    shows it (read-your-writes from the primary), while a second admin
+    session, reading the unsynced replica, does not until the next sync;
+  - checks that the dashboard and reports, read from the replica, are
+    still cached, and that with the HTTP cache on the second session's
+    page revalidates with a 304 until the replica is synced and with the
+    fresh page after.
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+from sqlalchemy import event
+from app import create_app, db
+from app.database import replica_bind_keys, sync_sqlite_replicas
+from benchmarks.dataset import ADMIN, DatasetSize, generate
+from benchmarks.routes import TestingConfig, _login
+
+PAGES = ['/dashboard', '/members', '/payments', '/attendance', '/plans', '/admin/inquiries',
+         '/admin/reports/revenue', '/admin/analytics/occupancy']
+# Served from the in-process caches when requested again
+CACHED = ['/dashboard', '/admin/reports/revenue', '/admin/analytics/occupancy']
+
+
+def make_app(primary, replica):
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+        SQLALCHEMY_REPLICA_URIS = ['sqlite:///' + replica]
+        SQLITE_JOURNAL_MODE = 'WAL'
+        HTTP_CACHE_ENABLED = True
+    return create_app(ReplicaConfig)
+
+
+def count_statements(app):
+    counts = Counter()
+    with app.app_context():
+        for key in [None] + replica_bind_keys(app.config):
+            def count(conn, cursor, statement, parameters, context, executemany, key=key or 'primary'):
+                counts[key] += 1
+            event.listen(db.engines[key], 'before_cursor_execute', count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=500)
+    args = parser.parse_args()
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'primary.db'), os.path.join(tmp, 'replica.db'))
+        with app.app_context():
+            db.create_all()
+            generate(DatasetSize(members=args.members, years=1))
+            sync_sqlite_replicas(db)
+        counts = count_statements(app)
+
+        client = app.test_client()
+        _login(client, ADMIN)
+        print(f'{"page":<32} {"primary":>8} {"replica_0":>10}')
+        for path in PAGES:
+            counts.clear()
+            response = client.get(path)
+            assert response.status_code == 200, f'{path}: {response.status_code}'
+            print(f'{path:<32} {counts["primary"]:>8} {counts["replica_0"]:>10}')
+            if not counts['replica_0']:
+                failures.append(f'{path} did not read from the replica')
+        for path in CACHED:
+            counts.clear()
+            client.get(path)
+            if counts['replica_0']:
+                failures.append(f'{path} was not cached when read from the replica')
+
+        other = app.test_client()
+        _login(other, ADMIN)
+        response = client.post('/plans/add', data={'name': 'Replica Check', 'duration_days': 30, 'price': '10'})
+        assert response.status_code == 302, response.status_code
+        counts.clear()
+        if b'Replica Check' not in client.get('/plans').data:
+            failures.append('the writer did not see its new plan')
+        if counts['replica_0']:
+            failures.append('the writer read from the replica right after writing')
+        stale = other.get('/plans')
+        if b'Replica Check' in stale.data:
+            failures.append('the unsynced replica already had the new plan')
+        headers = {'If-None-Match': stale.headers.get('ETag', '')}
+        if other.get('/plans', headers=headers).status_code != 304:
+            failures.append('a page read from the replica was not revalidated with a 304')
+        with app.app_context():
+            sync_sqlite_replicas(db)
+        fresh = other.get('/plans', headers=headers)
+        if fresh.status_code != 200 or b'Replica Check' not in fresh.data:
+            failures.append(f'the new plan was missing after syncing the replica ({fresh.status_code})')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    if failures:
+        sys.exit(1)
+    print('OK: reads routed to the replica, writes and read-your-writes on the primary')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""Latency, query count and peak memory for every route of the main blueprint.
+
+    python -m benchmarks.routes --members 5000 --years 3 --save-baseline
+    python -m benchmarks.routes --members 5000 --years 3   # compare
+
+Builds a synthetic dataset (benchmarks.dataset) in a temporary SQLite
+database, logs in an admin and a subscription user through the Flask test
+client and replays one scenario per route/role. Each scenario is timed for
+--iterations requests, then run once more with tracemalloc on to record SQL
+statements (app.profiling.count_queries) and peak Python memory.
+
+With a baseline file present, results are compared against it and the
+command exits with status 1 if any scenario issues more queries, is slower
+at p95 than --latency-tolerance allows, or peaks above --memory-tolerance.
+It also fails if a route of the blueprint has no scenario.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from config import Config, TestingConfig
+from app import create_app, db
+from app.models import Attendance, Member, MembershipPlan, Trainer, WorkoutPlan
+from app.profiling import count_queries
+from benchmarks.dataset import ADMIN, SUBSCRIBER, DatasetSize, generate
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Requests faster than this are never reported as latency regressions;
+# differences below it are timer noise.
+LATENCY_NOISE_FLOOR_MS = 2.0
+
+_unique = itertools.count()
+
+
+class Scenario:
+    """One request to replay. `path` and `data` may be callables taking the
+    iteration's unique number and the result of `setup`, which runs untimed
+    before each request (e.g. to create the row a delete route removes)."""
+
+    def __init__(self, endpoint, path, role='admin', method='GET', data=None, json=None,
+                 setup=None, status=200, name=None):
+        self.endpoint = endpoint
+        self.path = path
+        self.role = role
+        self.method = method
+        self.data = data
+        self.json = json
+        self.setup = setup
+        self.status = status
+        self.name = name or f'{method} {endpoint} ({role})'
+
+
+def _create(model, **values):
+    row = model(**values)
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def _login(client, credentials):
+    username, password = credentials
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, f'login as {username} failed'
+
+
+def scenarios(member_id, own_member_id):
+    today = date.today().isoformat()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M')
+    member_form = lambda n, _: {'name': f'Bench Member {n}', 'email': f'bench{n}@example.com',
+                                'membership_start_date': today, 'membership_plan': 1, 'trainer': 0,
+                                'workout_plan': 0}
+    return [
+        # Public pages
+        Scenario('main.home', '/', role='anon'),
+        Scenario('main.inquiry', '/inquiry', role='anon'),
+        Scenario('main.inquiry', '/inquiry', role='anon', method='POST', status=302,
+                 data=lambda n, _: {'name': f'Prospect {n}', 'email': f'p{n}@example.com', 'message': 'Hi'}),
+        Scenario('main.login', '/login', role='anon'),
+        Scenario('main.login', '/login', role='anon', method='POST', status=302,
+                 data={'username': ADMIN[0], 'password': ADMIN[1]}),
+        Scenario('main.logout', '/logout', role='anon', status=302,
+                 setup=lambda client, n: _login(client, ADMIN)),
+
+        # Admin
+        Scenario('main.dashboard', '/dashboard'),
+        Scenario('main.list_inquiries', '/admin/inquiries'),
+        Scenario('main.query_stats', '/admin/query_stats'),
+        Scenario('main.revenue_report', '/admin/reports/revenue'),
+        Scenario('main.occupancy_analytics', '/admin/analytics/occupancy',
+                 name='GET main.occupancy_analytics (last year, hourly)'),
+        Scenario('main.create_admin', '/admin/create_admin'),
+        Scenario('main.create_admin', '/admin/create_admin', method='POST', status=302,
+                 data=lambda n, _: {'username': f'admin{n}', 'email': f'admin{n}@example.com',
+                                    'password': 'pw', 'password2': 'pw'}),
+        Scenario('main.create_member_and_user', '/admin/create_member_and_user'),
+        Scenario('main.create_member_and_user', '/admin/create_member_and_user', method='POST', status=302,
+                 data=lambda n, ctx: {**member_form(n, ctx), 'email': f'account{n}@example.com',
+                                      'username': f'account{n}', 'password': 'pw', 'password2': 'pw'}),
+        Scenario('main.list_members', '/members'),
+        Scenario('main.list_members', '/members?status=expiring', name='GET main.list_members (expiring)'),
+        Scenario('main.member_search', '/members/search?q=member 00'),
+        Scenario('main.search', '/search?q=member 00'),
+        Scenario('main.add_member', '/members/add'),
+        Scenario('main.add_member', '/members/add', method='POST', status=302, data=member_form),
+        Scenario('main.view_member', f'/members/{member_id}'),
+        Scenario('main.member_history', f'/members/{member_id}/history/attendance',
+                 name='GET main.member_history (attendance)'),
+        Scenario('main.member_history', f'/members/{member_id}/history/payments',
+                 name='GET main.member_history (payments)'),
+        Scenario('main.edit_member', f'/members/edit/{member_id}'),
+        Scenario('main.edit_member', f'/members/edit/{member_id}', method='POST', status=302,
+                 data={'name': 'Edited Member', 'email': 'edited@example.com', 'membership_plan': 1,
+                       'trainer': 0, 'workout_plan': 0}),
+        Scenario('main.export_member', f'/members/export/{member_id}'),
+        Scenario('main.delete_member', lambda n, member: f'/members/delete/{member}', method='POST', status=302,
+                 setup=lambda client, n: _create(Member, name=f'Doomed {n}', email=f'doomed{n}@example.com')),
+        Scenario('main.bulk_export', '/admin/export/members.csv', name='GET main.bulk_export (members.csv)'),
+        Scenario('main.bulk_export', f'/admin/export/payments.ndjson?start={date.today().replace(day=1)}',
+                 name='GET main.bulk_export (payments.ndjson, this month)'),
+        Scenario('main.bulk_export', f'/admin/export/attendance.csv?member_id={member_id}',
+                 name='GET main.bulk_export (attendance.csv, one member)'),
+        Scenario('main.list_plans', '/plans'),
+        Scenario('main.add_plan', '/plans/add'),
+        Scenario('main.add_plan', '/plans/add', method='POST', status=302,
+                 data=lambda n, _: {'name': f'Plan {n}', 'duration_days': 30, 'price': 25}),
+        Scenario('main.edit_plan', '/plans/edit/1'),
+        Scenario('main.edit_plan', '/plans/edit/1', method='POST', status=302,
+                 data={'name': 'Monthly Basic', 'duration_days': 30, 'price': 30}),
+        Scenario('main.delete_plan', lambda n, plan: f'/plans/delete/{plan}', method='POST', status=302,
+                 setup=lambda client, n: _create(MembershipPlan, name=f'Doomed {n}', duration_days=1, price=1)),
+        Scenario('main.list_payments', '/payments'),
+        Scenario('main.add_payment', '/payments/add'),
+        Scenario('main.add_payment', '/payments/add', method='POST', status=302,
+                 data={'member': member_id, 'amount': 30, 'payment_date': today, 'membership_plan': 1}),
+        Scenario('main.list_attendance', '/attendance'),
+        Scenario('main.open_visits', '/attendance/open'),
+        Scenario('main.live_occupancy_api', '/api/occupancy/live'),
+        Scenario('main.check_in', '/attendance/checkin'),
+        Scenario('main.check_in', '/attendance/checkin', method='POST', status=302,
+                 data={'member': member_id, 'check_in_time': now}),
+        Scenario('main.api_check_in', '/api/attendance/checkin', method='POST',
+                 json={'scans': [{'member_id': member_id + offset} for offset in range(50)]},
+                 name='POST main.api_check_in (50 scans)'),
+        Scenario('main.check_out', lambda n, visit: f'/attendance/checkout/{visit}', method='POST', status=302,
+                 setup=lambda client, n: _create(Attendance, member_id=member_id, check_in_time=datetime.now())),
+        Scenario('main.list_trainers', '/trainers'),
+        Scenario('main.add_trainer', '/trainers/add'),
+        Scenario('main.add_trainer', '/trainers/add', method='POST', status=302,
+                 data=lambda n, _: {'name': f'Trainer {n}', 'specialization': 'Cardio'}),
+        Scenario('main.edit_trainer', '/trainers/edit/1'),
+        Scenario('main.edit_trainer', '/trainers/edit/1', method='POST', status=302,
+                 data={'name': 'Trainer 0', 'specialization': 'Strength'}),
+        Scenario('main.delete_trainer', lambda n, trainer: f'/trainers/delete/{trainer}', method='POST', status=302,
+                 setup=lambda client, n: _create(Trainer, name=f'Doomed {n}')),
+        Scenario('main.list_workout_plans', '/workout_plans'),
+        Scenario('main.add_workout_plan', '/workout_plans/add'),
+        Scenario('main.add_workout_plan', '/workout_plans/add', method='POST', status=302,
+                 data=lambda n, _: {'name': f'Workout {n}', 'routines': 'Run'}),
+        Scenario('main.edit_workout_plan', '/workout_plans/edit/1'),
+        Scenario('main.edit_workout_plan', '/workout_plans/edit/1', method='POST', status=302,
+                 data={'name': 'Workout 0', 'routines': 'Squat, bench, row'}),
+        Scenario('main.delete_workout_plan', lambda n, plan: f'/workout_plans/delete/{plan}', method='POST',
+                 status=302, setup=lambda client, n: _create(WorkoutPlan, name=f'Doomed {n}', routines='-')),
+
+        # Subscription user
+        Scenario('main.view_member', f'/members/{own_member_id}', role='subscription'),
+        Scenario('main.member_history', f'/members/{own_member_id}/history/attendance', role='subscription'),
+        Scenario('main.list_payments', '/payments', role='subscription'),
+        Scenario('main.list_attendance', '/attendance', role='subscription'),
+        Scenario('main.list_plans', '/plans', role='subscription'),
+        Scenario('main.list_trainers', '/trainers', role='subscription'),
+        Scenario('main.list_workout_plans', '/workout_plans', role='subscription'),
+    ]
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def _resolve(value, n, context):
+    return value(n, context) if callable(value) else value
+
+
+def _request(app, client, scenario, measure=nullcontext):
+    # Only the request itself runs inside `measure`, not the setup
+    n = next(_unique)
+    context = None
+    if scenario.setup:
+        with app.app_context():
+            context = scenario.setup(client, n)
+    with measure():
+        started = time.perf_counter()
+        response = client.open(_resolve(scenario.path, n, context), method=scenario.method,
+                               data=_resolve(scenario.data, n, context), json=scenario.json)
+        response.get_data()  # drain streamed bodies
+        elapsed = time.perf_counter() - started
+    if response.status_code != scenario.status:
+        raise AssertionError(f'{scenario.name}: expected {scenario.status}, got {response.status_code}')
+    return elapsed
+
+
+@contextmanager
+def _profiled(result):
+    tracemalloc.start()
+    try:
+        with count_queries() as counter:
+            yield
+    finally:
+        result['peak'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result['queries'] = counter.count
+
+
+def run_scenario(app, clients, scenario, iterations):
+    def client():
+        return app.test_client() if scenario.role == 'anon' else clients[scenario.role]
+
+    _request(app, client(), scenario)  # warm-up
+    latencies = [_request(app, client(), scenario) for _ in range(iterations)]
+    profile = {}
+    _request(app, client(), scenario, measure=lambda: _profiled(profile))
+
+    return {
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries': profile['queries'],
+        'peak_kib': profile['peak'] / 1024,
+    }
+
+
+def uncovered_endpoints(app, scenario_list):
+    covered = {scenario.endpoint for scenario in scenario_list}
+    return sorted({rule.endpoint for rule in app.url_map.iter_rules()
+                   if rule.endpoint.startswith('main.')} - covered)
+
+
+def compare(results, baseline, latency_tolerance, memory_tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+        if (result['p95_ms'] > before['p95_ms'] * (1 + latency_tolerance)
+                and result['p95_ms'] - before['p95_ms'] > LATENCY_NOISE_FLOOR_MS):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result['peak_kib'] > before['peak_kib'] * (1 + memory_tolerance):
+            regressions.append(f"{name}: peak memory {before['peak_kib']:.0f} -> {result['peak_kib']:.0f} KiB")
+    return regressions
+
+
+def make_app(db_path):
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        # Same journal settings as a deployed file database
+        SQLITE_JOURNAL_MODE = Config.SQLITE_JOURNAL_MODE
+        SQLITE_MMAP_SIZE = Config.SQLITE_MMAP_SIZE
+        # Every inquiry scenario posts from the same test client address
+        INQUIRY_RATE_BURST = 1_000_000
+    return create_app(BenchConfig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=2, help='Years of payment and attendance history.')
+    parser.add_argument('--visits-per-week', type=float, default=3)
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario.')
+    parser.add_argument('--only', help='Only run scenarios whose name contains this text.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Write results to --baseline.')
+    parser.add_argument('--latency-tolerance', type=float, default=0.25, help='Allowed p95 slowdown (0.25 = 25%%).')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help='Allowed peak memory growth.')
+    args = parser.parse_args()
+
+    size = DatasetSize(members=args.members, years=args.years, visits_per_week=args.visits_per_week)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            counts = generate(size)
+            print(f'Dataset built in {time.perf_counter() - started:.1f}s: '
+                  + ', '.join(f'{table}={count}' for table, count in counts.items()))
+            member_id = db.session.execute(db.select(Member.id).order_by(Member.id.desc())).scalar()
+            own_member_id = db.session.execute(db.select(Member.id).order_by(Member.id)).scalar()
+
+        clients = {'admin': app.test_client(), 'subscription': app.test_client()}
+        _login(clients['admin'], ADMIN)
+        _login(clients['subscription'], SUBSCRIBER)
+
+        # member_id is the newest member, so the check-in scans below it exist
+        scenario_list = scenarios(member_id - 50, own_member_id)
+        missing = uncovered_endpoints(app, scenario_list)
+        if args.only:
+            scenario_list = [scenario for scenario in scenario_list if args.only in scenario.name]
+
+        results = {}
+        print(f'{"scenario":<58} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"peak KiB":>9}')
+        for scenario in scenario_list:
+            result = run_scenario(app, clients, scenario, args.iterations)
+            results[scenario.name] = result
+            print(f'{scenario.name:<58} {result["p50_ms"]:>8.1f} {result["p95_ms"]:>8.1f} '
+                  f'{result["p99_ms"]:>8.1f} {result["queries"]:>8} {result["peak_kib"]:>9.0f}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump({'dataset': size.as_dict(), 'results': results}, fh, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+
+    failed = False
+    if missing:
+        print('Routes without a benchmark scenario: ' + ', '.join(missing), file=sys.stderr)
+        failed = True
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if baseline['dataset'] != size.as_dict():
+            print(f"Baseline was recorded with dataset {baseline['dataset']}; not comparing.", file=sys.stderr)
+        else:
+            regressions = compare(results, baseline['results'], args.latency_tolerance, args.memory_tolerance)
+            for regression in regressions:
+                print(f'REGRESSION {regression}', file=sys.stderr)
+            failed = failed or bool(regressions)
+            if not regressions:
+                print('No regressions against the baseline.')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Queries and latency per request with and without the user loader cache.
+
+    python -m benchmarks.user_loader --members 1000 --iterations 50
+
+Logs in an admin and a subscription user on a synthetic dataset
+(benchmarks.dataset) and requests a few pages of each with USER_CACHE_TTL
+set to 0 (a user query per request) and then to its configured value.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from config import Config
+from app import db
+from app.profiling import count_queries
+from benchmarks.dataset import ADMIN, SUBSCRIBER, DatasetSize, generate
+from benchmarks.routes import _login, make_app
+
+PAGES = [
+    ('admin', '/members'),
+    ('admin', '/payments'),
+    ('admin', '/plans'),
+    ('admin', '/admin/inquiries'),
+    ('subscription', '/attendance'),
+    ('subscription', '/plans'),
+]
+
+
+def measure(app, client, path, iterations):
+    client.get(path)  # warm-up, fills the cache when it is on
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, f'{path}: {response.status_code}'
+    with count_queries() as counter:
+        client.get(path)
+    return counter.count, statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=50, help='Timed requests per page and setting.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            generate(DatasetSize(members=args.members, years=1))
+        clients = {'admin': app.test_client(), 'subscription': app.test_client()}
+        _login(clients['admin'], ADMIN)
+        _login(clients['subscription'], SUBSCRIBER)
+
+        settings = [('off', 0), ('on', Config.USER_CACHE_TTL or 60)]
+        results = {}
+        for label, ttl in settings:
+            app.config['USER_CACHE_TTL'] = ttl
+            for role, path in PAGES:
+                results[role, path, label] = measure(app, clients[role], path, args.iterations)
+
+    print(f'{"page":<28} {"queries off":>11} {"queries on":>10} {"p50 off ms":>10} {"p50 on ms":>9}')
+    for role, path in PAGES:
+        (queries_off, p50_off), (queries_on, p50_on) = results[role, path, 'off'], results[role, path, 'on']
+        print(f'{f"{path} ({role})":<28} {queries_off:>11} {queries_on:>10} {p50_off:>10.2f} {p50_on:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
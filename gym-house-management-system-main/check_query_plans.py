@@ -0,0 +1,74 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app import create_app, db
+from app.models import Member, Payment, Attendance, User
+from app.pagination import keyset_query
+from app.services.dashboard import headline_counts_statement, membership_alert_statements
+from app.services.members import member_search_statement, member_summary_statement
+from app.services.visits import open_visits_query, live_occupancy_statement
+
+# Prints EXPLAIN QUERY PLAN for the queries behind each route, so we can check
+# they hit the indexes declared in app/models.py instead of scanning tables.
+# Run against a SQLite database (the default config).
+
+app = create_app()
+
+
+def route_queries(today):
+    member_id = 1
+    page_size = app.config['ITEMS_PER_PAGE'] + 1
+    attendance_cursor = f'{datetime.combine(today, datetime.min.time()).isoformat()}_1000'
+    payment_cursor = f'{today.isoformat()}_1000'
+
+    payments = Payment.query.options(joinedload(Payment.member), joinedload(Payment.plan))
+    attendance = Attendance.query.options(joinedload(Attendance.member))
+    expiring, needing_renewal = membership_alert_statements(app.config['DASHBOARD_ALERT_LIMIT'])
+    open_visit_age = timedelta(hours=app.config['OPEN_VISIT_MAX_HOURS'])
+
+    return [
+        ('login: user by username', User.query.filter_by(username='admin')),
+        ('member_search', member_search_statement('ali', app.config['MEMBER_SEARCH_LIMIT'])),
+        ('list_members', keyset_query(Member.query, Member.join_date, Member.id).limit(page_size)),
+        ('list_payments (admin)', keyset_query(payments, Payment.payment_date, Payment.id).limit(page_size)),
+        ('list_payments (admin, next page)',
+         keyset_query(payments, Payment.payment_date, Payment.id, payment_cursor).limit(page_size)),
+        ('list_payments (subscription)',
+         keyset_query(payments.filter(Payment.member_id == member_id), Payment.payment_date, Payment.id).limit(page_size)),
+        ('list_attendance (admin)', keyset_query(attendance, Attendance.check_in_time, Attendance.id).limit(page_size)),
+        ('list_attendance (admin, next page)',
+         keyset_query(attendance, Attendance.check_in_time, Attendance.id, attendance_cursor).limit(page_size)),
+        ('list_attendance (subscription)',
+         keyset_query(attendance.filter(Attendance.member_id == member_id), Attendance.check_in_time, Attendance.id).limit(page_size)),
+        ('view_member: summary', member_summary_statement(member_id)),
+        ('dashboard: headline counts', headline_counts_statement(today)),
+        ('dashboard: expiring members', expiring),
+        ('dashboard: members needing renewal', needing_renewal),
+        ('open_visits', keyset_query(open_visits_query(open_visit_age).options(joinedload(Attendance.member)),
+                                     Attendance.check_in_time, Attendance.id).limit(page_size)),
+        ('live_occupancy', live_occupancy_statement(open_visit_age)),
+    ]
+
+
+def explain(statement):
+    if hasattr(statement, 'statement'):  # Query -> Select
+        statement = statement.statement
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+
+
+with app.app_context():
+    if db.engine.dialect.name != 'sqlite':
+        raise SystemExit('EXPLAIN QUERY PLAN is SQLite-specific; point DATABASE_URL at a SQLite database.')
+
+    scans = 0
+    for label, statement in route_queries(date.today()):
+        print(f'== {label}')
+        for row in explain(statement):
+            detail = row[-1]
+            print(f'   {detail}')
+            if detail.startswith('SCAN') and 'USING' not in detail:
+                scans += 1
+        print()
+    print(f'{scans} full table scan(s) found.')
@@ -8,3 +8,203 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Keyset pagination for the list views; `per_page` in the query string is
+    # clamped to MAX_ITEMS_PER_PAGE.
+    ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE') or 50)
+    MAX_ITEMS_PER_PAGE = int(os.environ.get('MAX_ITEMS_PER_PAGE') or 200)
+
+    # Admin dashboard statistics are cached for this many seconds (and dropped
+    # early on member/payment/check-in writes); alert lists are capped.
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL') or 30)
+    DASHBOARD_ALERT_LIMIT = int(os.environ.get('DASHBOARD_ALERT_LIMIT') or 50)
+
+    # Type-ahead member search result cap, and how long plan/trainer/workout
+    # plan select choices are cached before re-reading them.
+    MEMBER_SEARCH_LIMIT = int(os.environ.get('MEMBER_SEARCH_LIMIT') or 20)
+    LOOKUP_CACHE_TTL = int(os.environ.get('LOOKUP_CACHE_TTL') or 60)
+
+    # Full-text search (/search): default and maximum results per query
+    SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT') or 20)
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS') or 100)
+
+    # Member profile: payments/visits shown per "load more" page, and how
+    # long the rendered summary (visit count, last visit, lifetime spend) is
+    # cached; it is dropped early when the member's history is written.
+    MEMBER_HISTORY_PAGE_SIZE = int(os.environ.get('MEMBER_HISTORY_PAGE_SIZE') or 10)
+    MEMBER_SUMMARY_CACHE_TTL = int(os.environ.get('MEMBER_SUMMARY_CACHE_TTL') or 300)
+
+    # JSON check-in API: scans per request, micro-batch size/window for the
+    # attendance writer, how long a request waits for the writer before
+    # reporting its scans as failed, and how long the active-member set may
+    # be reused.
+    CHECKIN_MAX_SCANS = int(os.environ.get('CHECKIN_MAX_SCANS') or 500)
+    CHECKIN_BATCH_SIZE = int(os.environ.get('CHECKIN_BATCH_SIZE') or 200)
+    CHECKIN_BATCH_WINDOW_MS = int(os.environ.get('CHECKIN_BATCH_WINDOW_MS') or 20)
+    CHECKIN_WRITE_TIMEOUT_SECONDS = float(os.environ.get('CHECKIN_WRITE_TIMEOUT_SECONDS') or 10)
+    ACTIVE_MEMBER_CACHE_TTL = int(os.environ.get('ACTIVE_MEMBER_CACHE_TTL') or 60)
+
+    # Rows fetched per round trip by the bulk CSV/NDJSON exports
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE') or 1000)
+
+    # HTTP caching of read-mostly pages (app/http_cache.py): ETags are
+    # revalidated at least every HTTP_CACHE_REVALIDATE_SECONDS, public pages
+    # may be cached by browsers for HTTP_CACHE_PUBLIC_MAX_AGE seconds, and up
+    # to HTTP_CACHE_PAGES rendered anonymous pages are kept in memory.
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', '1') != '0'
+    HTTP_CACHE_REVALIDATE_SECONDS = int(os.environ.get('HTTP_CACHE_REVALIDATE_SECONDS') or 300)
+    HTTP_CACHE_PUBLIC_MAX_AGE = int(os.environ.get('HTTP_CACHE_PUBLIC_MAX_AGE') or 60)
+    HTTP_CACHE_PAGES = int(os.environ.get('HTTP_CACHE_PAGES') or 128)
+
+    # Public inquiry form: per-address token bucket of INQUIRY_RATE_BURST
+    # submissions refilled at INQUIRY_RATE_PER_HOUR, repeats of an inquiry
+    # within the duplicate window dropped, and accepted inquiries written in
+    # batches of up to INQUIRY_BATCH_SIZE every INQUIRY_FLUSH_SECONDS, with
+    # at most INQUIRY_BUFFER_MAX waiting. A batch the database refuses is
+    # retried INQUIRY_WRITE_RETRIES times, then logged and dropped. Rate
+    # limit buckets are kept in RATE_LIMIT_STORE ('memory': per process, up
+    # to RATE_LIMIT_MAX_KEYS).
+    INQUIRY_RATE_BURST = int(os.environ.get('INQUIRY_RATE_BURST') or 5)
+    INQUIRY_RATE_PER_HOUR = int(os.environ.get('INQUIRY_RATE_PER_HOUR') or 10)
+    INQUIRY_DUPLICATE_WINDOW_HOURS = int(os.environ.get('INQUIRY_DUPLICATE_WINDOW_HOURS') or 24)
+    INQUIRY_BATCH_SIZE = int(os.environ.get('INQUIRY_BATCH_SIZE') or 100)
+    INQUIRY_FLUSH_SECONDS = float(os.environ.get('INQUIRY_FLUSH_SECONDS') or 2)
+    INQUIRY_BUFFER_MAX = int(os.environ.get('INQUIRY_BUFFER_MAX') or 10000)
+    INQUIRY_WRITE_RETRIES = int(os.environ.get('INQUIRY_WRITE_RETRIES') or 5)
+    RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE') or 'memory'
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS') or 10000)
+
+    # Number of reverse proxies in front of the app whose X-Forwarded-For,
+    # -Proto and -Host headers are trusted, so request.remote_addr (which
+    # the rate limits key on) is the visitor's address rather than the
+    # proxy's. Leave at 0 when clients connect directly: the headers could
+    # then be forged.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT') or 0)
+
+    # Logged-in users are loaded from a per-process cache (app/auth.py) of
+    # up to USER_CACHE_SIZE users. Role and password changes made by another
+    # process are checked against the database on role-restricted views and
+    # on writes, but read-only pages open to all roles can keep serving the
+    # old snapshot for up to USER_CACHE_TTL seconds: that is the longest a
+    # reset password or ended session may still read them. 0 disables the
+    # cache.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+
+    # bcrypt cost for new hashes; existing hashes are upgraded on next login.
+    # Bulk account creation hashes on a process pool, logins verify on a
+    # bounded thread pool.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS') or 4)
+
+    # Connection pool for server databases (PostgreSQL/MySQL). Sized per
+    # gunicorn worker; pre-ping and recycle drop connections the server or
+    # a proxy has closed.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = True
+
+    # Read replicas (app/database.py): comma-separated URLs in
+    # DATABASE_REPLICA_URLS. Read-only views and reports read from a random
+    # replica; a browser session that just wrote reads from the primary for
+    # REPLICA_STICKY_SECONDS. Cached results and ETags of replica reads are
+    # renewed when a SQLite replica is synced and otherwise at least every
+    # REPLICA_CACHE_TTL seconds. 'flask sync-replicas' copies a SQLite
+    # primary to SQLite replicas, standing in for replication in development.
+    SQLALCHEMY_REPLICA_URIS = [url.strip() for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',')
+                               if url.strip()]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 10)
+    REPLICA_CACHE_TTL = int(os.environ.get('REPLICA_CACHE_TTL') or 30)
+
+    # SQLite pragmas applied to every new connection. WAL with
+    # synchronous=NORMAL lets several workers read while one writes.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+
+    # Per-request query count and DB time, aggregated per route at
+    # /admin/query_stats. Statements slower than the threshold are logged
+    # with their route; X-Query-Count/X-Query-Time-Ms response headers are
+    # sent in debug mode or when QUERY_STATS_HEADERS is set.
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', '1') != '0'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS') or 100)
+    QUERY_STATS_HEADERS = bool(os.environ.get('QUERY_STATS_HEADERS'))
+
+    # Occupancy analytics: visits without a check-out are assumed to last
+    # this long; results are cached until attendance is written or the TTL
+    # passes. Requests whose curve would have more than OCCUPANCY_MAX_POINTS
+    # samples (default: a leap year at 5-minute steps) are refused.
+    OCCUPANCY_DEFAULT_VISIT_MINUTES = int(os.environ.get('OCCUPANCY_DEFAULT_VISIT_MINUTES') or 90)
+    OCCUPANCY_CACHE_TTL = int(os.environ.get('OCCUPANCY_CACHE_TTL') or 300)
+    OCCUPANCY_MAX_POINTS = int(os.environ.get('OCCUPANCY_MAX_POINTS') or 366 * 24 * 12)
+
+    # Revenue reports are cached until payments or plans are written or the
+    # TTL passes, and cover at most REVENUE_REPORT_MAX_DAYS days.
+    REVENUE_REPORT_CACHE_TTL = int(os.environ.get('REVENUE_REPORT_CACHE_TTL') or 300)
+    REVENUE_REPORT_MAX_DAYS = int(os.environ.get('REVENUE_REPORT_MAX_DAYS') or 10 * 366)
+
+    # Visits open longer than this are left out of live occupancy and are
+    # checked out by 'flask close-stale-visits'.
+    OPEN_VISIT_MAX_HOURS = int(os.environ.get('OPEN_VISIT_MAX_HOURS') or 6)
+
+    # Memberships ending within this many days count as 'expiring'. The
+    # refresh job records an 'expired' renewal notice only for memberships
+    # that ended within the grace period, not for long-lapsed ones.
+    MEMBERSHIP_EXPIRING_DAYS = int(os.environ.get('MEMBERSHIP_EXPIRING_DAYS') or 7)
+    RENEWAL_NOTICE_GRACE_DAYS = int(os.environ.get('RENEWAL_NOTICE_GRACE_DAYS') or 30)
+
+    # Recording a payment (and the membership extension it buys) is retried
+    # this many times when a concurrent payment for the same member wins.
+    MEMBERSHIP_UPDATE_RETRIES = int(os.environ.get('MEMBERSHIP_UPDATE_RETRIES') or 5)
+
+    # Notification outbox: renewal reminders and payment receipts are queued
+    # in the database and sent by 'flask deliver-notifications' in batches of
+    # NOTIFICATION_BATCH_SIZE, NOTIFICATION_CONCURRENCY at a time. Failed
+    # sends are retried with exponential backoff from NOTIFICATION_RETRY_SECONDS.
+    # The 'file' transport appends JSON lines to NOTIFICATION_FILE instead of
+    # sending mail; 'smtp' uses the SMTP_* settings.
+    NOTIFICATION_TRANSPORT = os.environ.get('NOTIFICATION_TRANSPORT') or 'file'
+    NOTIFICATION_FILE = os.environ.get('NOTIFICATION_FILE') or os.path.join(basedir, 'instance', 'notifications.jsonl')
+    NOTIFICATION_SENDER = os.environ.get('NOTIFICATION_SENDER') or 'Gym House <noreply@gymhouse.local>'
+    NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE') or 100)
+    NOTIFICATION_CONCURRENCY = int(os.environ.get('NOTIFICATION_CONCURRENCY') or 4)
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS') or 6)
+    NOTIFICATION_RETRY_SECONDS = int(os.environ.get('NOTIFICATION_RETRY_SECONDS') or 60)
+    SMTP_HOST = os.environ.get('SMTP_HOST') or 'localhost'
+    SMTP_PORT = int(os.environ.get('SMTP_PORT') or 25)
+    SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_USE_TLS = bool(os.environ.get('SMTP_USE_TLS'))
+    SMTP_TIMEOUT = int(os.environ.get('SMTP_TIMEOUT') or 10)
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class ProductionConfig(Config):
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    QUERY_STATS_HEADERS = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+    BCRYPT_LOG_ROUNDS = 4
+    # An in-memory database has no journal to put in WAL mode
+    SQLITE_JOURNAL_MODE = 'MEMORY'
+    SQLITE_MMAP_SIZE = 0
+
+
+# Selected by create_app() from the FLASK_CONFIG environment variable
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+    'default': Config,
+}
@@ -90,9 +90,19 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The full-text search tables (and FTS5's shadow tables) are managed by
+    # app/services/search.py rather than the models, so autogenerate must
+    # not offer to drop them.
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not (name.startswith('search_index') or name == 'search_document')
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
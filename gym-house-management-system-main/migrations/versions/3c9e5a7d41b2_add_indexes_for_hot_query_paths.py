@@ -0,0 +1,54 @@
+"""add indexes for hot query paths
+
+Revision ID: 3c9e5a7d41b2
+Revises: fbc9494263ce
+Create Date: 2026-10-17 09:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e5a7d41b2'
+down_revision = 'fbc9494263ce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Attendance: global list/today's check-ins seek on check_in_time, and the
+    # per-member history filters on member_id then orders by check_in_time.
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_check_in_time', ['check_in_time'], unique=False)
+        batch_op.create_index('ix_attendance_member_id_check_in_time', ['member_id', 'check_in_time'], unique=False)
+
+    # Payment: same shape as attendance, keyed on payment_date.
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_payment_date', ['payment_date'], unique=False)
+        batch_op.create_index('ix_payment_member_id_payment_date', ['member_id', 'payment_date'], unique=False)
+
+    # Member: list order and the dashboard's active/expiring/lapsed ranges.
+    with op.batch_alter_table('member', schema=None) as batch_op:
+        batch_op.create_index('ix_member_join_date', ['join_date'], unique=False)
+        batch_op.create_index('ix_member_membership_end_date', ['membership_end_date'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_member_id', ['member_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_member_id')
+
+    with op.batch_alter_table('member', schema=None) as batch_op:
+        batch_op.drop_index('ix_member_membership_end_date')
+        batch_op.drop_index('ix_member_join_date')
+
+    with op.batch_alter_table('payment', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_member_id_payment_date')
+        batch_op.drop_index('ix_payment_payment_date')
+
+    with op.batch_alter_table('attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendance_member_id_check_in_time')
+        batch_op.drop_index('ix_attendance_check_in_time')
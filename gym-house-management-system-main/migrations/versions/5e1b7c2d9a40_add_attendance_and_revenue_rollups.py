@@ -0,0 +1,55 @@
+"""add attendance and revenue rollups
+
+Revision ID: 5e1b7c2d9a40
+Revises: 8d2f0b6c9e14
+Create Date: 2026-10-17 17:41:09.312877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1b7c2d9a40'
+down_revision = '8d2f0b6c9e14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    attendance_rollup = op.create_table('attendance_rollup',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('hour', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('check_ins', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'hour')
+    )
+    revenue_rollup = op.create_table('revenue_rollup',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('plan_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('payments', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'plan_id')
+    )
+
+    # Backfill from the existing rows; from here on the app keeps them current.
+    attendance = sa.table('attendance', sa.column('id'), sa.column('check_in_time', sa.DateTime()))
+    day = sa.func.date(attendance.c.check_in_time)
+    hour = sa.extract('hour', attendance.c.check_in_time)
+    op.execute(attendance_rollup.insert().from_select(
+        ['day', 'hour', 'check_ins'],
+        sa.select(day, hour, sa.func.count(attendance.c.id)).group_by(day, hour)
+    ))
+
+    payment = sa.table('payment', sa.column('id'), sa.column('payment_date'), sa.column('plan_id'),
+                       sa.column('amount'))
+    plan_id = sa.func.coalesce(payment.c.plan_id, 0)
+    op.execute(revenue_rollup.insert().from_select(
+        ['day', 'plan_id', 'payments', 'amount'],
+        sa.select(payment.c.payment_date, plan_id, sa.func.count(payment.c.id), sa.func.sum(payment.c.amount))
+        .group_by(payment.c.payment_date, plan_id)
+    ))
+
+
+def downgrade():
+    op.drop_table('revenue_rollup')
+    op.drop_table('attendance_rollup')
@@ -0,0 +1,29 @@
+"""link subscription users to their members
+
+Revision ID: 5e2b7c9a4d16
+Revises: a61f5d3e9c27
+Create Date: 2026-10-17 21:42:37.510834
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b7c9a4d16'
+down_revision = 'a61f5d3e9c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ownership checks now use user.member_id instead of matching emails, so
+    # fill it in for subscription accounts created before it was set
+    op.execute(
+        'UPDATE "user" SET member_id = (SELECT member.id FROM member WHERE member.email = "user".email) '
+        "WHERE member_id IS NULL AND role = 'subscription'"
+    )
+
+
+def downgrade():
+    # The links are correct either way; nothing to undo
+    pass
@@ -0,0 +1,64 @@
+"""add full-text search index
+
+Revision ID: 8c4e1b7f2d93
+Revises: 3f9d2a6c8b71
+Create Date: 2026-10-17 20:11:05.214876
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e1b7f2d93'
+down_revision = '3f9d2a6c8b71'
+branch_labels = None
+depends_on = None
+
+# (kind, code, table, title column, body columns); keys are id * 4 + code,
+# as in app/services/search.py
+DOCUMENTS = [
+    ('member', 0, 'member', 'name', ('email', 'phone')),
+    ('inquiry', 1, 'inquiry', 'name', ('email', 'message')),
+    ('trainer', 2, 'trainer', 'name', ('specialization', 'schedule')),
+    ('workout_plan', 3, 'workout_plan', 'name', ('description', 'routines')),
+]
+
+
+def _backfill(target):
+    for kind, code, table, title, body in DOCUMENTS:
+        body_sql = " || ' ' || ".join(f"coalesce({column}, '')" for column in body)
+        op.execute(
+            f"INSERT INTO {target} (rowid, kind, ref_id, title, body) "
+            f"SELECT id * 4 + {code}, '{kind}', id, coalesce({title}, ''), {body_sql} FROM {table}"
+        )
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_index USING fts5("
+            "kind UNINDEXED, ref_id UNINDEXED, title, body, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute("INSERT INTO search_index(search_index, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 1.0)')")
+        _backfill('search_index')
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE search_document ("
+            "rowid BIGINT PRIMARY KEY, kind VARCHAR(20) NOT NULL, ref_id INTEGER NOT NULL, "
+            "title TEXT NOT NULL, body TEXT NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+            ") STORED)"
+        )
+        _backfill('search_document')
+        op.execute('CREATE INDEX ix_search_document_document ON search_document USING GIN (document)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE search_index')
+    elif dialect == 'postgresql':
+        op.execute('DROP TABLE search_document')
@@ -0,0 +1,28 @@
+"""add member name/email search indexes
+
+Revision ID: 8d2f0b6c9e14
+Revises: 3c9e5a7d41b2
+Create Date: 2026-10-17 11:03:27.904551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f0b6c9e14'
+down_revision = '3c9e5a7d41b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression indexes backing the case-insensitive prefix search used by
+    # the member picker (lower(name) >= :term AND lower(name) < :upper).
+    op.create_index('ix_member_name_lower', 'member', [sa.text('lower(name)')], unique=False)
+    op.create_index('ix_member_email_lower', 'member', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_member_email_lower', table_name='member')
+    op.drop_index('ix_member_name_lower', table_name='member')
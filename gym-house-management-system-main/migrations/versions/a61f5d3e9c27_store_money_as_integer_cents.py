@@ -0,0 +1,52 @@
+"""store money as integer cents
+
+Revision ID: a61f5d3e9c27
+Revises: 8c4e1b7f2d93
+Create Date: 2026-10-17 21:03:52.640188
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61f5d3e9c27'
+down_revision = '8c4e1b7f2d93'
+branch_labels = None
+depends_on = None
+
+# (table, float column, cents column)
+MONEY_COLUMNS = [
+    ('membership_plan', 'price', 'price_cents'),
+    ('payment', 'amount', 'amount_cents'),
+    ('revenue_rollup', 'amount', 'amount_cents'),
+]
+
+
+def upgrade():
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(new, sa.BigInteger(), nullable=True))
+        op.execute(f'UPDATE {table} SET {new} = CAST(ROUND({old} * 100) AS BIGINT)')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(new, existing_type=sa.BigInteger(), nullable=False)
+            batch_op.drop_column(old)
+
+    # The rollup was summed in floating point; recompute it from the exact
+    # payment amounts.
+    op.execute('DELETE FROM revenue_rollup')
+    op.execute(
+        'INSERT INTO revenue_rollup (day, plan_id, payments, amount_cents) '
+        'SELECT payment_date, coalesce(plan_id, 0), count(id), sum(amount_cents) '
+        'FROM payment GROUP BY payment_date, coalesce(plan_id, 0)'
+    )
+
+
+def downgrade():
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(old, sa.Float(), nullable=True))
+        op.execute(f'UPDATE {table} SET {old} = {new} / 100.0')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(old, existing_type=sa.Float(), nullable=False)
+            batch_op.drop_column(new)
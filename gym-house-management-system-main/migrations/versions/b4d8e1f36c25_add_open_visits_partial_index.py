@@ -0,0 +1,28 @@
+"""add open visits partial index
+
+Revision ID: b4d8e1f36c25
+Revises: 5e1b7c2d9a40
+Create Date: 2026-10-17 18:02:51.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d8e1f36c25'
+down_revision = '5e1b7c2d9a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only rows without a check-out are indexed, so the front desk list and
+    # live occupancy count stay cheap however much history accumulates.
+    op.create_index('ix_attendance_open', 'attendance', ['check_in_time'], unique=False,
+                    sqlite_where=sa.text('check_out_time IS NULL'),
+                    postgresql_where=sa.text('check_out_time IS NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_attendance_open', table_name='attendance')
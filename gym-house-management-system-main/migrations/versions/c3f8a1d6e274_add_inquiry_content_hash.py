@@ -0,0 +1,31 @@
+"""add inquiry content hash and submitted_at index
+
+Revision ID: c3f8a1d6e274
+Revises: 5e2b7c9a4d16
+Create Date: 2026-10-17 22:15:08.274913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d6e274'
+down_revision = '5e2b7c9a4d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing inquiries keep a NULL hash; only new submissions are compared
+    with op.batch_alter_table('inquiry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_inquiry_content_hash', ['content_hash'], unique=False)
+        batch_op.create_index('ix_inquiry_submitted_at', ['submitted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inquiry', schema=None) as batch_op:
+        batch_op.drop_index('ix_inquiry_submitted_at')
+        batch_op.drop_index('ix_inquiry_content_hash')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,61 @@
+"""add membership status and renewal notices
+
+Revision ID: e7a3c9d05f18
+Revises: b4d8e1f36c25
+Create Date: 2026-10-17 18:24:13.085412
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c9d05f18'
+down_revision = 'b4d8e1f36c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('member', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('membership_status', sa.String(length=10), nullable=False,
+                                      server_default='none'))
+        batch_op.create_index('ix_member_status_end_date', ['membership_status', 'membership_end_date'], unique=False)
+        batch_op.create_index('ix_member_status_join_date', ['membership_status', 'join_date'], unique=False)
+
+    op.create_table('renewal_notice',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('member_id', sa.Integer(), nullable=False),
+    sa.Column('membership_end_date', sa.Date(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['member_id'], ['member.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('member_id', 'membership_end_date', 'kind', name='uq_renewal_notice')
+    )
+    with op.batch_alter_table('renewal_notice', schema=None) as batch_op:
+        batch_op.create_index('ix_renewal_notice_created_at', ['created_at'], unique=False)
+
+    # Backfill statuses as of today (7-day expiring window, the default);
+    # `flask refresh-memberships` keeps them current from here on.
+    member = sa.table('member', sa.column('membership_end_date', sa.Date()),
+                      sa.column('membership_status', sa.String()))
+    today = datetime.utcnow().date()
+    op.execute(member.update().values(membership_status=sa.case(
+        (member.c.membership_end_date.is_(None), 'none'),
+        (member.c.membership_end_date < today, 'expired'),
+        (member.c.membership_end_date <= today + timedelta(days=7), 'expiring'),
+        else_='active',
+    )))
+
+
+def downgrade():
+    with op.batch_alter_table('renewal_notice', schema=None) as batch_op:
+        batch_op.drop_index('ix_renewal_notice_created_at')
+
+    op.drop_table('renewal_notice')
+    with op.batch_alter_table('member', schema=None) as batch_op:
+        batch_op.drop_index('ix_member_status_join_date')
+        batch_op.drop_index('ix_member_status_end_date')
+        batch_op.drop_column('membership_status')